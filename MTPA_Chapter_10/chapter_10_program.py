@@ -12,6 +12,18 @@ import statsmodels.api as sm  # statistical models (including regression)
 import statsmodels.formula.api as smf  # R-like model specification
 from sklearn.tree import DecisionTreeRegressor  # machine learning tree
 from sklearn.ensemble import RandomForestRegressor # ensemble method
+from sklearn.linear_model import LinearRegression  # linear regression
+
+# import user-defined module
+# cross-validation of many models in parallel
+from chapter_10_utilities import cross_validate_models
+# geographically weighted regression with adaptive bandwidth
+from chapter_10_utilities import fit_gwr, gwr_predict
+# spatial index for selecting block groups by region
+from chapter_10_utilities import spatial_index, select_bounding_box,\
+    select_radius, select_polygon
+# random forest settings compared by out-of-bag error
+from chapter_10_utilities import tune_random_forest
 
 # read in the housing data with white-space delimiters
 prelim_houses = pd.read_table('houses_data.txt', header = None, \
@@ -60,10 +72,33 @@ BB_BOTTOM = 32
 BB_RIGHT = -116.75
 BB_LEFT = -125
 
-houses_selected = houses[houses['latitude'] < BB_TOP]
-houses_selected = houses_selected[houses_selected['longitude'] < BB_RIGHT]
-houses_selected = houses_selected[houses_selected['latitude'] > BB_BOTTOM]
-houses_selected = houses_selected[houses_selected['longitude'] > BB_LEFT]
+# spatial index on block group locations, built once for all regions
+houses_index = spatial_index(houses)
+
+houses_selected = houses.take(select_bounding_box(houses_index,\
+    left = BB_LEFT, right = BB_RIGHT, bottom = BB_BOTTOM, top = BB_TOP))
+
+# with the index, looking at many metropolitan areas is a cheap loop
+# regions may be bounding boxes, circles (radius in miles), or polygons
+metro_regions = {'San Diego':\
+        select_bounding_box(houses_index, left = BB_LEFT,\
+            right = BB_RIGHT, bottom = BB_BOTTOM, top = BB_TOP),\
+    'Los Angeles':\
+        select_bounding_box(houses_index, left = -118.95,\
+            right = -117.65, bottom = 33.7, top = 34.35),\
+    'San Francisco Bay Area':\
+        select_polygon(houses_index, [(-122.55, 37.85), (-122.5, 37.45),\
+            (-121.75, 37.2), (-121.8, 37.75), (-122.15, 38.1)]),\
+    'Sacramento':\
+        select_radius(houses_index, latitude = 38.58,\
+            longitude = -121.49, radius = 25)}
+metro_summary = pd.DataFrame({'block groups':\
+        [len(rows) for rows in metro_regions.values()],\
+    'median value':\
+        [houses['value'].iloc[rows].median()\
+        for rows in metro_regions.values()]},\
+    index = list(metro_regions.keys()))
+print(metro_summary)
 
 # examine structure of selected block groups
 print(houses_selected.shape)
@@ -265,10 +300,29 @@ print('\nFull Random Forest Prop of Test Set Variance Accounted for: ',\
 # --------------------------------------
 # Geographically weighted regression
 # --------------------------------------    
-# exercise for the student
-# use rpy2 to obtain results from R
-full_gwr_train_result = None
-full_gwr_test_result = None
+# Pace and Barry (1997) explanatory variables in local regressions
+# bandwidth (number of nearest neighbors) selected by AICc
+gwr_features = ['income', 'income_squared', 'income_cubed', 'log_age',\
+    'log_pc_rooms', 'log_pc_bedrooms', 'log_pop_hh', 'log_hh']
+gwr_train_fit = fit_gwr(houses_selected_train, 'log_value', gwr_features)
+
+print('\nGWR bandwidth (nearest neighbors): ', gwr_train_fit['n_neighbors'])
+print('GWR effective number of parameters: ',\
+    round(gwr_train_fit['trace_hat'], 1))
+print('GWR AICc: ', round(gwr_train_fit['aicc'], 1))
+print(gwr_train_fit['coefficients'].describe())
+
+full_gwr_train_result = round(gwr_train_fit['r_squared'], 3)
+print('\nGWR Proportion of Training Set Variance Accounted for: ',\
+    full_gwr_train_result)
+
+houses_selected_test['gwr_predict_log_value'] =\
+    gwr_predict(gwr_train_fit, houses_selected_test)
+full_gwr_test_result = \
+    round(np.power(houses_selected_test['log_value']\
+        .corr(houses_selected_test['gwr_predict_log_value']),2),3)
+print('\nGWR Proportion of Test Set Variance Accounted for: ',\
+    full_gwr_test_result)
 
 # --------------------------------------
 # Gather results for a single report
@@ -301,50 +355,79 @@ print(table_data_frame)
 # --------------------------------------------------
 # we have been using a simple training-and-test split for validation
 # an alternative is multi-fold cross-validation, as shown here
-# for the simple tree-structured regression model
-
-from sklearn import cross_validation
+# for all of the modeling methods with each set of explanatory variables
 
 # specify number of folds for multi-fold cross-validation
 # a simple training-and-test regimen would have two folds
 specified_n_folds = 5
 
-# specify the modeling technique or method of analysis
-tree_model_maker = DecisionTreeRegressor(random_state = 9999, max_depth = 5)
-
-# specify the response variable 
-y = houses_selected.loc[:, ['log_value']]
-
-# specify the explanatory variables 
-X = houses_selected.loc[:, ['income', 'age', 'rooms', 'bedrooms', 'pop', 'hh']]
-
-# specify cross-validation method, including number of folds
-cvfold = cross_validation.KFold(len(y), n_folds = specified_n_folds,\
-    indices = False)
-
-# initialize list for storing cross-validation results
-cv_results = []
-
-# iterate across the folds fitting to train, testing on test
-for train, test in cvfold:
-
-    # define training and test sets for this fold
-    X_train, X_test, y_train, y_test = X[train], X[test], y[train], y[test]
-       
-    # fit to training data for this fold
-    tree_model_fit = tree_model_maker.fit(X_train, y_train)
-        
-    # compute proportion of response variance accounted 
-    # for in the test set in this fold, and add to the
-    # list of cross-validation results
-    y_test_predict = tree_model_fit.predict(X_test)
-    cv_fold_result = np.power(np.corrcoef(y_test.T, y_test_predict),2)
-    cv_results.append(cv_fold_result[0, 1])  
-
-print('\nProportion of Training Set Variance Accounted for ',\
-    'using ', specified_n_folds, 'Folds in Cross-Validation:',
-    round(np.mean(cv_results) ,3))
+# specify the modeling techniques or methods of analysis
+cv_models = {'Linear regression': LinearRegression(),\
+    'Tree-structured regression':\
+        DecisionTreeRegressor(random_state = 9999, max_depth = 5),\
+    'Random forests': RandomForestRegressor(random_state = 9999)}
+
+# specify the sets of explanatory variables
+cv_feature_sets = {'Pace and Barry (1997)': ['income', 'income_squared',\
+        'income_cubed', 'log_age', 'log_pc_rooms', 'log_pc_bedrooms',\
+        'log_pop_hh', 'log_hh'],\
+    'simple model': ['income', 'age', 'rooms', 'bedrooms', 'pop', 'hh'],\
+    'full model': ['income', 'age', 'rooms', 'bedrooms', 'pop', 'hh',\
+        'log_pc_rooms', 'log_pc_bedrooms', 'log_pop_hh']}
+
+# every method with every set of explanatory variables for every fold
+# is fit in parallel, with the data shared across worker processes
+# the response variable is log_value, and the result for each fold is
+# the proportion of test set variance accounted for
+if __name__ == '__main__':
+    cv_results = cross_validate_models(houses_selected, 'log_value',\
+        cv_models, cv_feature_sets, n_folds = specified_n_folds,\
+        random_state = 9999, n_jobs = None)
+    print(cv_results)
+
+    print('\nProportion of Test Set Variance Accounted for ',\
+        'using ', specified_n_folds, 'Folds in Cross-Validation:')
+    print(cv_results.pivot_table('r_squared', index = 'model',\
+        columns = 'features', aggfunc = 'mean').round(3))
 
+# --------------------------------------------------
+# better settings for the random forest (full model)
+# each forest is grown once in stages with warm_start and scored on
+# out-of-bag observations, so the training set alone is used for tuning
+rf_features = ['income', 'age', 'rooms', 'bedrooms',\
+    'pop', 'hh', 'log_pc_rooms', 'log_pc_bedrooms', 'log_pop_hh']
+if __name__ == '__main__':
+    rf_tuning = tune_random_forest(houses_selected_train, 'log_value',\
+        rf_features, max_features = [0.33, 0.5, 1.0],\
+        min_samples_leaf = [1, 5, 10],\
+        n_estimators = [25, 50, 100, 200, 400],\
+        random_state = 9999, n_jobs = None)
+
+    # out-of-bag curve: proportion of variance accounted for
+    # by number of trees for each setting
+    print('\nRandom Forest Out-of-Bag Proportion of Variance Accounted for:')
+    print(rf_tuning.pivot_table('oob_r_squared', index = 'n_estimators',\
+        columns = ['max_features', 'min_samples_leaf']).round(3))
+
+    rf_best = rf_tuning.loc[rf_tuning['oob_r_squared'].idxmax()]
+    print('\nBest random forest settings:')
+    print(rf_best)
+
+    tuned_rf_model_maker = RandomForestRegressor(\
+        n_estimators = int(rf_best['n_estimators']),\
+        max_features = rf_best['max_features'],\
+        min_samples_leaf = int(rf_best['min_samples_leaf']),\
+        random_state = 9999)
+    tuned_rf_model_fit = tuned_rf_model_maker.fit(\
+        houses_selected_train.loc[:, rf_features],\
+        houses_selected_train['log_value'])
+    houses_selected_test['tuned_rf_predict_log_value'] =\
+        tuned_rf_model_fit.predict(houses_selected_test.loc[:, rf_features])
+    tuned_rf_test_result = \
+        round(np.power(houses_selected_test['log_value']\
+            .corr(houses_selected_test['tuned_rf_predict_log_value']),2),3)
+    print('\nTuned Random Forest Prop of Test Set Variance Accounted for: ',\
+        tuned_rf_test_result)
 
 # Suggestions for the student:
 # Try alternative formulations for the linear predictor.
@@ -0,0 +1,447 @@
+# Utilities for Regression Modeling with California Housing Values (Python)
+
+import os  # number of processors available
+import time  # timing model fits
+import warnings  # bandwidth search reaching its limit
+from concurrent.futures import ProcessPoolExecutor  # parallel processing
+from multiprocessing import shared_memory  # data shared across processes
+import numpy as np  # arrays and math functions
+import pandas as pd  # data frame operations
+from matplotlib.path import Path  # points inside polygons
+from scipy.spatial import cKDTree  # nearest-neighbor search
+from sklearn.base import clone  # unfitted copies of model specifications
+from sklearn.ensemble import RandomForestRegressor  # ensemble method
+
+
+# Cross-Validation for Many Models in Parallel (Python)
+
+# data for cross-validation jobs in this process
+_shared_data = {}
+
+# attach to the shared data array and fold assignments
+# (run once in each worker process)
+def _attach_shared_data(name, shape, dtype, folds):
+    memory = shared_memory.SharedMemory(name = name)
+    _shared_data['memory'] = memory
+    _shared_data['values'] = np.ndarray(shape, dtype = dtype,
+        buffer = memory.buf)
+    _shared_data['folds'] = folds
+
+# apply function to each set of arguments, with values (and fold
+# assignments) placed once in shared memory for all worker processes
+def _map_shared_data(function, arguments, values, folds, n_jobs):
+    if n_jobs is None:
+        n_jobs = os.cpu_count() or 1
+    if n_jobs == 1:
+        _shared_data.update({'values': values, 'folds': folds})
+        try:
+            return(list(map(function, *arguments)))
+        finally:
+            _shared_data.clear()
+    memory = shared_memory.SharedMemory(create = True, size = values.nbytes)
+    try:
+        np.ndarray(values.shape, dtype = values.dtype,
+            buffer = memory.buf)[:] = values
+        with ProcessPoolExecutor(max_workers = n_jobs,
+            initializer = _attach_shared_data, initargs = (memory.name,
+            values.shape, values.dtype.str, folds)) as executor:
+            return(list(executor.map(function, *arguments)))
+    finally:
+        memory.close()
+        memory.unlink()
+
+# fit one model specification to the training folds and score it
+# on the held-out fold... the proportion of response variance
+# accounted for is the squared correlation of observed and predicted
+def _fit_fold(model, columns, fold):
+    values, folds = _shared_data['values'], _shared_data['folds']
+    train = folds != fold
+    X, y = values[:, columns], values[:, 0]
+    start = time.time()
+    model_fit = clone(model).fit(X[train], y[train])
+    fit_seconds = time.time() - start
+    y_test, y_test_predict = y[~train], model_fit.predict(X[~train])
+    return({'n_train': int(train.sum()), 'n_test': len(y_test),
+        'r_squared': np.power(np.corrcoef(y_test, y_test_predict)[0, 1], 2),
+        'rmse': np.sqrt(np.mean(np.power(y_test - y_test_predict, 2))),
+        'fit_seconds': fit_seconds})
+
+# multi-fold cross-validation for every model with every feature set
+# each model, feature set, and fold is a separate job on a process pool,
+# with the data placed once in shared memory rather than copied to
+# every job, so with enough workers the total time is about that of
+# the slowest fold
+# input data = data frame with response and explanatory variables
+#       response = name of the response variable
+#       models = dictionary of model names and sklearn model specifications
+#       feature_sets = dictionary of feature set names and lists of
+#                      explanatory variables
+#       n_folds = number of folds
+#       random_state = seed for assigning observations to folds
+#       n_jobs = number of worker processes (1 runs in this process)
+# output = data frame with model, features, fold, n_train, n_test,
+#          r_squared (proportion of test set variance accounted for),
+#          rmse (test set root-mean-squared error), and fit_seconds
+def cross_validate_models(data, response, models, feature_sets,
+    n_folds = 5, random_state = None, n_jobs = None):
+    variables = [response]
+    for features in feature_sets.values():
+        variables = variables + [feature for feature in features
+            if feature not in variables]
+    values = np.ascontiguousarray(data[variables].to_numpy(dtype = float))
+    folds = np.random.default_rng(random_state).permutation(len(values)) \
+        % n_folds
+    jobs = [(model_name, set_name, fold)
+        for model_name in models for set_name in feature_sets
+        for fold in range(n_folds)]
+    arguments = [[models[model_name] for model_name, _, _ in jobs],
+        [[variables.index(feature) for feature in feature_sets[set_name]]
+            for _, set_name, _ in jobs],
+        [fold for _, _, fold in jobs]]
+    scores = _map_shared_data(_fit_fold, arguments, values, folds, n_jobs)
+    results = pd.DataFrame(scores)
+    results.insert(0, 'model', [model_name for model_name, _, _ in jobs])
+    results.insert(1, 'features', [set_name for _, set_name, _ in jobs])
+    results.insert(2, 'fold', [fold + 1 for _, _, fold in jobs])
+    return(results)
+
+
+# Random Forest Tuning with Out-of-Bag Error (Python)
+
+# grow one random forest in stages with warm_start, adding trees to
+# those already grown, and score it on the out-of-bag observations
+# (those not in the bootstrap sample for a tree) after each stage
+def _grow_forest(max_features, min_samples_leaf, n_estimators,
+    random_state):
+    values = _shared_data['values']
+    X, y = values[:, 1:], values[:, 0]
+    forest = RandomForestRegressor(max_features = max_features,
+        min_samples_leaf = min_samples_leaf, oob_score = True,
+        warm_start = True, random_state = random_state, n_jobs = 1)
+    curve = []
+    fit_seconds = 0.0
+    for n_trees in n_estimators:
+        start = time.time()
+        forest.set_params(n_estimators = n_trees).fit(X, y)
+        fit_seconds = fit_seconds + time.time() - start
+        curve.append({'n_estimators': n_trees,
+            'oob_r_squared': forest.oob_score_,
+            'oob_rmse': np.sqrt(np.mean(np.power(y -
+                forest.oob_prediction_, 2))),
+            'fit_seconds': fit_seconds})
+    return(curve)
+
+# random forest settings compared by out-of-bag error
+# each combination of max_features and min_samples_leaf is one forest,
+# grown once to the largest number of trees on a process pool, so the
+# out-of-bag curve for every number of trees comes without refitting
+# or holding out data... all forests use the same random_state
+# input data = data frame with response and explanatory variables
+#       response = name of the response variable
+#       features = list of explanatory variables
+#       max_features = list of values to try (proportion or number
+#                      of features considered at each split)
+#       min_samples_leaf = list of values to try
+#       n_estimators = increasing numbers of trees for the curve
+#       random_state = seed for the forests
+#       n_jobs = number of worker processes (1 runs in this process)
+# output = data frame with max_features, min_samples_leaf, n_estimators,
+#          oob_r_squared (out-of-bag proportion of variance accounted
+#          for), oob_rmse, and fit_seconds (cumulative for the forest)
+def tune_random_forest(data, response, features,
+    max_features = [0.33, 0.5, 1.0], min_samples_leaf = [1, 5, 10],
+    n_estimators = [25, 50, 100, 200, 400], random_state = None,
+    n_jobs = None):
+    values = np.ascontiguousarray(
+        data[[response] + list(features)].to_numpy(dtype = float))
+    candidates = [(features_tried, leaf_size)
+        for features_tried in max_features for leaf_size in min_samples_leaf]
+    arguments = [[features_tried for features_tried, _ in candidates],
+        [leaf_size for _, leaf_size in candidates],
+        [sorted(n_estimators)] * len(candidates),
+        [random_state] * len(candidates)]
+    curves = _map_shared_data(_grow_forest, arguments, values, None, n_jobs)
+    results = []
+    for (features_tried, leaf_size), curve in zip(candidates, curves):
+        for stage in curve:
+            results.append(dict({'max_features': features_tried,
+                'min_samples_leaf': leaf_size}, **stage))
+    return(pd.DataFrame(results))
+
+
+# Geographically Weighted Regression (Python)
+
+# planar coordinates from latitude and longitude in degrees
+# longitude is scaled by the cosine of the reference latitude so
+# that distances are approximately proportional to miles
+def _planar_coordinates(latitude, longitude, reference_latitude):
+    return(np.column_stack([np.asarray(longitude, dtype = float) *
+        np.cos(np.radians(reference_latitude)),
+        np.asarray(latitude, dtype = float)]))
+
+# local weighted least squares at many points, in batches of points
+# neighbors and distances are the nearest training points for each point,
+# sorted by distance, of which the first n_neighbors are used with
+# bisquare weights (1 - (d / d_max)^2)^2 for d_max the distance
+# to the farthest of them... points are taken in the order given by
+# order (nearby points together, so neighbors are shared within batches)
+# output = local coefficients for each point, and x' (X'WX)^-1 x for
+#          each point (the diagonal of the hat matrix at training points)
+def _local_regressions(X, y, X_points, neighbors, distances, n_neighbors,
+    batch_size, order = None):
+    if order is None:
+        order = np.arange(len(X_points))
+    coefficients = np.zeros(X_points.shape)
+    leverage = np.zeros(len(X_points))
+    for start in range(0, len(X_points), batch_size):
+        batch = order[start:(start + batch_size)]
+        index = neighbors[batch, :n_neighbors]
+        distance = distances[batch, :n_neighbors]
+        # bandwidth a little beyond the farthest neighbor, so that
+        # every neighbor has positive weight
+        bandwidth = distance[:, -1:] * (1 + 1e-6) + 1e-12
+        root_weights = 1 - np.power(distance / bandwidth, 2)
+        X_local = X[index]
+        X_local *= root_weights[:, :, np.newaxis]
+        X_local_t = X_local.transpose(0, 2, 1)
+        cross_products = np.matmul(X_local_t, X_local)
+        right_sides = np.stack([np.matmul(X_local_t,
+            (y[index] * root_weights)[:, :, np.newaxis])[:, :, 0],
+            X_points[batch]], axis = 2)
+        try:
+            solutions = np.linalg.solve(cross_products, right_sides)
+        except np.linalg.LinAlgError:
+            solutions = np.matmul(np.linalg.pinv(cross_products),
+                right_sides)
+        coefficients[batch] = solutions[:, :, 0]
+        leverage[batch] = np.sum(X_points[batch] * solutions[:, :, 1],
+            axis = 1)
+    return(coefficients, leverage)
+
+# corrected Akaike information criterion for a GWR fit
+# (Fotheringham, Brunsdon, and Charlton 2002)
+def _gwr_aicc(residuals, trace_hat):
+    n = len(residuals)
+    sigma = np.sqrt(np.sum(np.power(residuals, 2)) / n)
+    return(2 * n * np.log(sigma) + n * np.log(2 * np.pi) +
+        n * (n + trace_hat) / (n - 2 - trace_hat))
+
+# geographically weighted regression with an adaptive bandwidth
+# each location has its own regression, weighting its nearest neighbors
+# by a bisquare kernel... neighbors come from a KD-tree on latitude and
+# longitude, found once for the largest bandwidth and reused for every
+# bandwidth tried, and the number of neighbors is chosen by golden
+# section search to minimize AICc (unless set by n_neighbors)... if AICc
+# is lowest at max_neighbors, the search continues above it, doubling
+# max_neighbors up to max_neighbors_limit (with a warning at the limit)
+# input data = data frame with response, explanatory variables,
+#              latitude, and longitude
+#       response = name of the response variable
+#       features = list of explanatory variables (intercept is added)
+#       n_neighbors = number of neighbors (None to search)
+#       min_neighbors, max_neighbors = range for the search
+#       max_neighbors_limit = largest number of neighbors searched
+#                             (memory for neighbors grows with it)
+#       tol = search stops when the range is within this proportion
+#       batch_size = points solved together (small batches stay in cache)
+# output = dictionary with n_neighbors, coefficients (data frame),
+#          fitted values, residuals, trace_hat, aicc, r_squared,
+#          search (AICc for each number of neighbors tried), and the
+#          training data needed by gwr_predict
+def fit_gwr(data, response, features, n_neighbors = None,
+    min_neighbors = None, max_neighbors = 500, max_neighbors_limit = 2000,
+    tol = 0.01, batch_size = 100):
+    X = np.column_stack([np.ones(len(data)),
+        data[features].to_numpy(dtype = float)])
+    y = data[response].to_numpy(dtype = float)
+    reference_latitude = data['latitude'].mean()
+    coordinates = _planar_coordinates(data['latitude'], data['longitude'],
+        reference_latitude)
+    if min_neighbors is None:
+        min_neighbors = 2 * X.shape[1]
+    max_neighbors = min(len(y), max_neighbors if n_neighbors is None
+        else n_neighbors)
+    max_neighbors_limit = min(len(y), max(max_neighbors,
+        max_neighbors_limit))
+    tree = cKDTree(coordinates)
+    # KD-tree leaf order places nearby points together
+    order = tree.indices
+    nearest = {}
+    def find_neighbors(k):
+        distances, neighbors = tree.query(coordinates, k = k)
+        nearest['distances'] = distances.reshape(len(y), -1)
+        nearest['neighbors'] = neighbors.reshape(len(y), -1)
+    find_neighbors(max_neighbors)
+    search = {}
+    def aicc(k):
+        if k not in search:
+            coefficients, leverage = _local_regressions(X, y, X,
+                nearest['neighbors'], nearest['distances'], k, batch_size,
+                order)
+            search[k] = _gwr_aicc(y - np.sum(X * coefficients, axis = 1),
+                leverage.sum())
+        return(search[k])
+    if n_neighbors is None:
+        golden = (np.sqrt(5) - 1) / 2
+        lower, upper = min(min_neighbors, max_neighbors), max_neighbors
+        while True:
+            while upper - lower > max(2, tol * upper):
+                middle_lower = int(round(upper - golden * (upper - lower)))
+                middle_upper = int(round(lower + golden * (upper - lower)))
+                if aicc(middle_lower) <= aicc(middle_upper):
+                    upper = middle_upper
+                else:
+                    lower = middle_lower
+            # rounding to whole neighbors can leave the best bandwidth
+            # tried outside the final range, so the ends of the range are
+            # tried too and the best of all bandwidths tried is chosen
+            aicc(lower)
+            aicc(upper)
+            n_neighbors = min(search, key = search.get)
+            if max_neighbors - n_neighbors <= max(2, tol * max_neighbors):
+                aicc(max_neighbors)
+                n_neighbors = min(search, key = search.get)
+            if n_neighbors < max_neighbors or \
+                max_neighbors >= max_neighbors_limit:
+                break
+            # AICc still falling at the largest bandwidth: search above it
+            lower = max_neighbors
+            max_neighbors = upper = min(2 * max_neighbors,
+                max_neighbors_limit)
+            find_neighbors(max_neighbors)
+        if n_neighbors == max_neighbors < len(y):
+            warnings.warn('GWR bandwidth search reached max_neighbors_limit'
+                ' = ' + str(max_neighbors) + '; AICc may be lower with more'
+                ' neighbors')
+    coefficients, leverage = _local_regressions(X, y, X,
+        nearest['neighbors'], nearest['distances'], n_neighbors,
+        batch_size, order)
+    fitted = np.sum(X * coefficients, axis = 1)
+    return({'n_neighbors': n_neighbors,
+        'coefficients': pd.DataFrame(coefficients, index = data.index,
+            columns = ['Intercept'] + list(features)),
+        'fitted': pd.Series(fitted, index = data.index),
+        'residuals': pd.Series(y - fitted, index = data.index),
+        'trace_hat': leverage.sum(), 'aicc': aicc(n_neighbors),
+        'r_squared': np.power(np.corrcoef(y, fitted)[0, 1], 2),
+        'search': pd.Series(search).sort_index(),
+        'features': list(features), 'X': X, 'y': y, 'tree': tree,
+        'reference_latitude': reference_latitude,
+        'batch_size': batch_size})
+
+# predictions from a geographically weighted regression at new locations
+# each location has a local regression on its nearest training points
+# input gwr_fit = dictionary from fit_gwr
+#       data = data frame with explanatory variables, latitude,
+#              and longitude
+# output = series of predicted values
+def gwr_predict(gwr_fit, data):
+    X_points = np.column_stack([np.ones(len(data)),
+        data[gwr_fit['features']].to_numpy(dtype = float)])
+    distances, neighbors = gwr_fit['tree'].query(_planar_coordinates(
+        data['latitude'], data['longitude'],
+        gwr_fit['reference_latitude']), k = gwr_fit['n_neighbors'])
+    coefficients, leverage = _local_regressions(gwr_fit['X'], gwr_fit['y'],
+        X_points, neighbors.reshape(len(data), -1),
+        distances.reshape(len(data), -1), gwr_fit['n_neighbors'],
+        gwr_fit['batch_size'])
+    return(pd.Series(np.sum(X_points * coefficients, axis = 1),
+        index = data.index))
+
+
+# Spatial Index for Region Selection (Python)
+
+# mean radius of the earth and miles per degree of latitude,
+# for radius queries
+EARTH_RADIUS_MILES = 3958.8
+MILES_PER_DEGREE = EARTH_RADIUS_MILES * np.pi / 180
+
+# great-circle (haversine) distance in miles between locations in degrees
+def _haversine_miles(latitude, longitude, other_latitude, other_longitude):
+    latitude, other_latitude = np.radians(latitude), \
+        np.radians(other_latitude)
+    half_chord = np.power(np.sin((other_latitude - latitude) / 2), 2) + \
+        np.cos(latitude) * np.cos(other_latitude) * \
+        np.power(np.sin(np.radians(other_longitude - longitude) / 2), 2)
+    return(2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.minimum(half_chord,
+        1))))
+
+# spatial index on the locations of rows of a data frame
+# built once, then used for any number of region queries
+# input data = data frame with latitude and longitude in degrees
+# output = dictionary with a KD-tree on planar coordinates, the
+#          planar coordinates of each row, and latitude and longitude
+def spatial_index(data, latitude = 'latitude', longitude = 'longitude'):
+    reference_latitude = data[latitude].mean()
+    coordinates = _planar_coordinates(data[latitude], data[longitude],
+        reference_latitude)
+    return({'tree': cKDTree(coordinates), 'coordinates': coordinates,
+        'reference_latitude': reference_latitude,
+        'latitude': data[latitude].to_numpy(dtype = float),
+        'longitude': data[longitude].to_numpy(dtype = float)})
+
+# rows within a bounding box, as with the chained comparisons
+# latitude < top, longitude < right, latitude > bottom, longitude > left
+# the KD-tree returns the rows within squares that cover the box
+# (one square, or a row of squares for a long narrow box), and only
+# those rows are compared
+# input index = dictionary from spatial_index
+#       left, right = longitude bounds in degrees
+#       bottom, top = latitude bounds in degrees
+# output = sorted row positions (for data.iloc or data.take)
+def select_bounding_box(index, left, right, bottom, top):
+    corners = _planar_coordinates([bottom, top], [left, right],
+        index['reference_latitude'])
+    sides = corners[1] - corners[0]
+    n_squares = int(min(64, np.ceil(sides.max() / max(sides.min(), 1e-12))))
+    half_width = sides.max() / n_squares / 2
+    long_side = np.argmax(sides)
+    centers = np.tile(corners.mean(axis = 0), (n_squares, 1))
+    centers[:, long_side] = corners[0, long_side] +\
+        (np.arange(n_squares) + 0.5) * 2 * half_width
+    rows = np.unique(np.concatenate([np.asarray(found, dtype = np.intp)
+        for found in index['tree'].query_ball_point(centers,
+            max(half_width, sides.min() / 2), p = np.inf)]))
+    coordinates = index['coordinates'][rows]
+    inside = (coordinates[:, 0] > corners[0, 0]) &\
+        (coordinates[:, 0] < corners[1, 0]) &\
+        (coordinates[:, 1] > corners[0, 1]) &\
+        (coordinates[:, 1] < corners[1, 1])
+    return(rows[inside])
+
+# rows within a great-circle distance of a location
+# planar coordinates scale longitude for the latitude of the index, not
+# of the location, so the KD-tree returns candidates within a radius
+# widened for that difference, and candidates are kept by exact distance
+# input index = dictionary from spatial_index
+#       latitude, longitude = center of the region in degrees
+#       radius = distance in miles
+# output = sorted row positions (for data.iloc or data.take)
+def select_radius(index, latitude, longitude, radius):
+    center = _planar_coordinates([latitude], [longitude],
+        index['reference_latitude'])[0]
+    # latitude within the region farthest from the equator, where
+    # longitude is most compressed relative to the planar coordinates
+    farthest_latitude = min(89.0, abs(latitude) + radius / MILES_PER_DEGREE)
+    widening = max(1.0, np.cos(np.radians(index['reference_latitude'])) /
+        np.cos(np.radians(farthest_latitude)))
+    rows = np.sort(np.asarray(index['tree'].query_ball_point(center,
+        1.01 * widening * radius / MILES_PER_DEGREE), dtype = np.intp))
+    distance = _haversine_miles(latitude, longitude,
+        index['latitude'][rows], index['longitude'][rows])
+    return(rows[distance <= radius])
+
+# rows within a polygon, such as the outline of a metropolitan area
+# candidate rows come from the bounding box of the polygon
+# input index = dictionary from spatial_index
+#       vertices = list of (longitude, latitude) pairs in degrees
+# output = sorted row positions (for data.iloc or data.take)
+def select_polygon(index, vertices):
+    vertices = np.asarray(vertices, dtype = float)
+    rows = select_bounding_box(index,
+        left = vertices[:, 0].min(), right = vertices[:, 0].max(),
+        bottom = vertices[:, 1].min(), top = vertices[:, 1].max())
+    outline = Path(_planar_coordinates(vertices[:, 1], vertices[:, 0],
+        index['reference_latitude']))
+    inside = outline.contains_points(index['coordinates'][rows])
+    return(rows[inside])
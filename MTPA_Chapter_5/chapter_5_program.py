@@ -7,9 +7,15 @@ from __future__ import division, print_function
 import pandas as pd  # data structures for time series analysis
 import datetime  # date manipulation
 import matplotlib.pyplot as plt
-from statsmodels.tsa.arima_model import ARIMA  # time series modeling
+from statsmodels.tsa.arima.model import ARIMA  # time series modeling
 from statsmodels.tsa.stattools import grangercausalitytests as granger
 
+# import user-defined module
+from chapter_5_utilities import rolling_origin_backtest, forecast_accuracy,\
+    transform_panel, select_var_order, fit_var, var_forecast,\
+    var_impulse_response, arima_order_search, seasonal_decompose_panel,\
+    fit_exponential_smoothing, exponential_smoothing_forecast
+
 # additional time series functions available in R
 # from rpy2.robjects import r  # interface from Python to R
 
@@ -129,20 +135,12 @@ plt.legend(loc = 'best')
 plt.xlabel('')
 
 # using March 1997 as reference data 
-print(modeling_mts.ix['1997-03-01'])  # (ICS = 100 on this date)
-# define indexing constants 
-indexing_constant = modeling_mts.ix['1997-03-01']
-ER0 = indexing_constant['ER']
-DGO0 = indexing_constant['DGO']
-NHS0 = indexing_constant['NHS']
-
-# compute indexed time series
-modeling_mts['IER'] = \
-    modeling_mts['ER'].apply(lambda d: (d/ER0) * 100) 
-modeling_mts['IDGO'] = \
-    modeling_mts['DGO'].apply(lambda d: (d/DGO0) * 100) 
-modeling_mts['INHS'] = \
-    modeling_mts['NHS'].apply(lambda d: (d/NHS0) * 100) 
+print(modeling_mts.loc['1997-03-01'])  # (ICS = 100 on this date)
+
+# compute indexed time series IER, IDGO, and INHS 
+# dividing each whole column by its value on the reference date
+modeling_mts = modeling_mts.join(transform_panel(modeling_mts, 'rebase',\
+    columns = ['ER', 'DGO', 'NHS'], reference_date = '1997-03-01'))
 
 # create working multiple time series with just the indexed series
 working_economic_mts = \
@@ -238,6 +236,52 @@ NHS_arima_model_selected = ARIMA(NHS_data['NHS'], order = (2,1,2)).fit()
 print(NHS_arima_model_selected.params)
 # look-ahead forecasts needed 
 
+# New Homes Sold is not seasonally adjusted
+# decompose all four series at once into trend, seasonal, and remainder
+# components using the shared monthly calendar of the modeling panel
+# (months where all four series are observed, so there are no gaps)
+economic_decomposition = seasonal_decompose_panel(\
+    modeling_mts[['ER', 'DGO', 'ICS', 'NHS']], period = 12)
+print('\nSeasonal Components (one year)')
+print(economic_decomposition['seasonal'].iloc[:12])
+
+# seasonal ARIMA model search for New Homes Sold
+# adding seasonal (P,D,Q,12) components to the first differenced models
+# with candidate models fit in parallel 
+# models are ranked by AIC separately for each seasonal differencing D,
+# with the backtest below comparing across differencing orders
+if __name__ == '__main__':
+    print('\nNHS_seasonal_arima_model Search')
+    NHS_seasonal_search = arima_order_search(NHS_data['NHS'],\
+        orders = [(1,1,1), (1,1,2), (2,1,1), (2,1,2)],\
+        seasonal_orders = [(0,0,0,0), (1,0,1,12), (0,1,1,12), (1,1,1,12)],\
+        n_jobs = None)
+    print(NHS_seasonal_search)
+
+# AIC compares models within the sample used for fitting
+# rolling-origin backtest compares the same candidate orders out-of-sample
+# forecasts one to six months ahead from each of the last 24 origins
+# with forecast origins spread across processes
+if __name__ == '__main__':
+    candidate_orders = {'ER': [(1,1,1), (1,1,2), (2,1,1), (2,1,2)],
+        'DGO': [(1,1,1), (1,1,2), (2,1,1), (2,1,2)],
+        'ICS': [(1,0,1), (1,0,2), (2,0,1), (2,0,2)],
+        'NHS': [(1,1,1), (1,1,2), (2,1,1), (2,1,2)]}
+    candidate_seasonal_orders = {'ER': [(0,0,0,0)], 'DGO': [(0,0,0,0)],
+        'ICS': [(0,0,0,0)], 'NHS': [(0,0,0,0), (0,1,1,12)]}
+    backtest = rolling_origin_backtest({'ER': ER_data['ER'],
+        'DGO': DGO_data['DGO'], 'ICS': ICS_data['ICS'],
+        'NHS': NHS_data['NHS']}, candidate_orders,
+        seasonal_orders = candidate_seasonal_orders,
+        horizon = 6, n_origins = 24)
+    backtest_accuracy = forecast_accuracy(backtest,\
+        by = ['series', 'order', 'seasonal_order'])
+    print('\nRolling-Origin Backtest (1 to 6 months ahead)')
+    print(backtest_accuracy)
+    print(forecast_accuracy(backtest)\
+        .pivot_table(index = ['series', 'order', 'seasonal_order'],\
+        columns = 'step', values = 'RMSE'))
+
 # Which regressors have potential as leading indicators?
 # look for relationships across three of the time series
 # using the period of overlap for those series
@@ -274,6 +318,31 @@ ER_from_ICS =  pd.DataFrame(modeling_mts, columns = ['ER','ICS'])
 test = granger(ER_from_ICS, maxlag = 3, addconst=True, verbose=False)
 print('ER_from_ICS:',test[3][0]['params_ftest'])
 
+# vector autoregression for the four indexed series together
+# select the lag order by information criteria, fit all equations
+# in one least-squares solve, and forecast one year ahead
+print('\nVector Autoregression Lag Order Selection')
+var_order_selection = select_var_order(working_economic_mts, max_lags = 8)
+print(var_order_selection)
+var_lags = int(var_order_selection.loc[\
+    var_order_selection['BIC'].idxmin(), 'lags'])
+economic_var_model = fit_var(working_economic_mts, lags = max(1, var_lags))
+print('Lags:', economic_var_model['lags'])
+print(var_forecast(economic_var_model, steps = 12))
+
+# orthogonalized impulse responses of each series to a shock in ICS
+economic_var_irf = var_impulse_response(economic_var_model, steps = 12)
+print(pd.DataFrame(economic_var_irf[:, :, 2],\
+    columns = economic_var_model['names']))
+
+# Holt-Winters exponential smoothing with additive trend and seasonality
+# fit to all four indexed series at once as a baseline for ARIMA and VAR
+economic_smoothing = fit_exponential_smoothing(working_economic_mts,\
+    period = 12, trend = True)
+print('\nExponential Smoothing Parameters')
+print(economic_smoothing['parameters'])
+print(exponential_smoothing_forecast(economic_smoothing, steps = 12))
+
 # Suggestions for the student:
 # Explore additional forecasting methods such as exponential smoothing.
 # Explore dynamic linear models and state space approaches.
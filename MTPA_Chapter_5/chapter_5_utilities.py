@@ -0,0 +1,522 @@
+# Utilities for Analysis of Economic Time Series (Python)
+
+import os  # number of processors available
+import hashlib  # keys for cached decompositions
+import warnings  # quiet repeated estimation warnings in the backtests
+from collections import OrderedDict  # cache of recent decompositions
+from concurrent.futures import ProcessPoolExecutor  # parallel processing
+import numpy as np  # arrays and math functions
+import pandas as pd  # data structures for time series analysis
+from statsmodels.tsa.arima.model import ARIMA  # time series modeling
+
+
+# ARIMA Model Search (Python)
+
+# no seasonal component... the default for model searches
+no_seasonal_order = (0, 0, 0, 0)
+
+# AIC for one candidate model
+def _arima_aic(values, order, seasonal_order):
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        fit = ARIMA(values, order = order,
+            seasonal_order = seasonal_order).fit()
+    return(fit.aic)
+
+# fit each candidate order to a single time series
+# input series = pandas Series or array of observations
+#       orders = list of (p, d, q) tuples to try
+#       seasonal_orders = list of (P, D, Q, s) tuples to try with each order
+#       n_jobs = number of worker processes (1 runs in this process)
+# output = data frame of orders and AIC values, with models grouped by
+#          differencing orders d and D and ranked by AIC within each group
+# AIC is comparable only among models with the same differencing, which
+# sets the observations and scale of the likelihood... to compare across
+# differencing orders, use rolling_origin_backtest
+def arima_order_search(series, orders, seasonal_orders = [no_seasonal_order],
+    n_jobs = 1):
+    values = np.asarray(series, dtype = float)
+    candidates = [(tuple(order), tuple(seasonal_order))
+        for order in orders for seasonal_order in seasonal_orders]
+    if n_jobs == 1:
+        aic = [_arima_aic(values, order, seasonal_order)
+            for (order, seasonal_order) in candidates]
+    else:
+        with ProcessPoolExecutor(max_workers = n_jobs) as executor:
+            aic = list(executor.map(_arima_aic,
+                [values] * len(candidates),
+                [order for (order, seasonal_order) in candidates],
+                [seasonal_order for (order, seasonal_order) in candidates]))
+    return(pd.DataFrame({'order': [order for (order, seasonal_order)
+            in candidates],
+        'seasonal_order': [seasonal_order for (order, seasonal_order)
+            in candidates],
+        'd': [order[1] for (order, seasonal_order) in candidates],
+        'D': [seasonal_order[1] for (order, seasonal_order) in candidates],
+        'aic': aic})\
+        .sort_values(['d', 'D', 'aic']).reset_index(drop = True))
+
+
+# Rolling-Origin Backtesting of ARIMA Models (Python)
+
+# forecasts from a contiguous block of forecast origins for one model
+# each origin is warm-started from parameters fit at the previous origin
+# so only the first origin in the block begins from default values
+def _backtest_block(values, order, seasonal_order, origins, horizon,
+    window):
+    forecasts = np.empty((len(origins), horizon))
+    params = None
+    for index, origin in enumerate(origins):
+        first = 0 if window is None else max(0, origin - window)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            fit = ARIMA(values[first:origin], order = order,
+                seasonal_order = seasonal_order).fit(start_params = params)
+        params = fit.params
+        forecasts[index, :] = fit.forecast(horizon)
+    return(forecasts)
+
+# rolling-origin (time series cross-validation) evaluation
+# input series_dict = dictionary of name: pandas Series
+#       orders = list of (p, d, q) tuples used for every series
+#                or dictionary of name: list of (p, d, q) tuples
+#       seasonal_orders = list of (P, D, Q, s) tuples used with every order
+#                         or dictionary of name: list of (P, D, Q, s) tuples
+#       horizon = number of steps ahead forecast from each origin
+#       n_origins = number of forecast origins at the end of each series
+#       step = number of observations between adjacent origins
+#       window = None for expanding window or length of rolling window
+#       n_jobs = number of worker processes (1 runs in this process)
+#       block_size = origins per task, defaulting to an even split
+#                    of each series' origins across the worker processes
+# output = data frame with one row per series, model, origin, and step
+def rolling_origin_backtest(series_dict, orders,
+    seasonal_orders = [no_seasonal_order], horizon = 1, n_origins = 24,
+    step = 1, window = None, n_jobs = None, block_size = None):
+    if n_jobs is None:
+        n_jobs = os.cpu_count() or 1
+    if block_size is None:
+        block_size = max(1, int(np.ceil(n_origins / n_jobs)))
+
+    tasks = []
+    for name, series in series_dict.items():
+        series = series.dropna()
+        values = np.asarray(series, dtype = float)
+        last_origin = len(values) - horizon
+        origins = list(range(last_origin - (n_origins - 1) * step,
+            last_origin + 1, step))
+        if origins[0] < 1:
+            raise ValueError('series ' + str(name) +
+                ' is too short for the requested origins')
+        series_orders = orders[name] if isinstance(orders, dict) else orders
+        series_seasonal_orders = seasonal_orders[name] \
+            if isinstance(seasonal_orders, dict) else seasonal_orders
+        for order in series_orders:
+            for seasonal_order in series_seasonal_orders:
+                for start in range(0, len(origins), block_size):
+                    tasks.append((name, series, values, tuple(order),
+                        tuple(seasonal_order),
+                        origins[start:(start + block_size)]))
+
+    if n_jobs == 1:
+        block_forecasts = [_backtest_block(values, order, seasonal_order,
+            block, horizon, window) for (name, series, values, order,
+            seasonal_order, block) in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers = n_jobs) as executor:
+            futures = [executor.submit(_backtest_block, values, order,
+                seasonal_order, block, horizon, window)
+                for (name, series, values, order, seasonal_order, block)
+                in tasks]
+            block_forecasts = [future.result() for future in futures]
+
+    frames = []
+    steps = np.arange(1, horizon + 1)
+    for (name, series, values, order, seasonal_order, block), forecasts in \
+        zip(tasks, block_forecasts):
+        block = np.asarray(block)
+        target = block[:, np.newaxis] + steps - 1
+        frames.append(pd.DataFrame({'series': name,
+            'order': [order] * forecasts.size,
+            'seasonal_order': [seasonal_order] * forecasts.size,
+            'origin': np.repeat(series.index[block - 1], horizon),
+            'step': np.tile(steps, len(block)),
+            'forecast': forecasts.ravel(),
+            'actual': values[target].ravel()}))
+    backtest = pd.concat(frames, ignore_index = True)
+    backtest['error'] = backtest['actual'] - backtest['forecast']
+    return(backtest)
+
+# out-of-sample accuracy from rolling_origin_backtest results
+# input backtest = data frame returned by rolling_origin_backtest
+#       by = columns defining the rows of the accuracy table
+# output = data frame with MAE, RMSE, and MAPE (percent)
+def forecast_accuracy(backtest,
+    by = ['series', 'order', 'seasonal_order', 'step']):
+    measures = pd.DataFrame({'absolute_error': backtest['error'].abs(),
+        'squared_error': np.square(backtest['error']),
+        'absolute_percentage_error':
+            (backtest['error'] / backtest['actual']).abs() * 100})
+    for column in by:
+        measures[column] = backtest[column]
+    accuracy = measures.groupby(by, sort = False).mean()
+    accuracy['squared_error'] = np.sqrt(accuracy['squared_error'])
+    accuracy.columns = ['MAE', 'RMSE', 'MAPE']
+    return(accuracy.reset_index())
+
+
+# Panel Transformations of Economic Time Series (Python)
+
+# prefixes identifying the transformed columns
+panel_transform_prefixes = {'rebase': 'I', 'log_diff': 'DL',
+    'yoy': 'YOY', 'seasonal_diff': 'SD'}
+
+# whole-array transformations of time series sharing a date index
+# rows are assumed to be consecutive periods (as after dropna on a panel)
+# input panel = data frame with one column per time series
+#       method = 'rebase' for index relative to the reference date
+#                'log_diff' for first differences of natural logarithms
+#                'yoy' for percentage change from one year earlier
+#                'seasonal_diff' for difference from one year earlier
+#       columns = columns to transform (default is all columns)
+#       reference_date = index label of base period for 'rebase'
+#       periods = number of periods per year for 'yoy' and 'seasonal_diff'
+#       base = value of rebased series on the reference date
+# output = data frame of transformed series with prefixed column names
+#          (for example, ER rebased to 100 becomes IER)
+def transform_panel(panel, method, columns = None, reference_date = None,
+    periods = 12, base = 100):
+    if method not in panel_transform_prefixes:
+        raise ValueError('unknown panel transformation: ' + str(method))
+    if columns is None:
+        columns = list(panel.columns)
+    values = panel[columns].to_numpy(dtype = float)
+    transformed = np.full(values.shape, np.nan)
+    if method == 'rebase':
+        if reference_date is None:
+            raise ValueError('rebase requires a reference_date')
+        reference = values[panel.index.get_loc(reference_date)]
+        transformed = values * (base / reference)
+    elif method == 'log_diff':
+        transformed[1:] = np.diff(np.log(values), axis = 0)
+    elif method == 'yoy':
+        transformed[periods:] = \
+            (values[periods:] / values[:-periods] - 1) * 100
+    else:
+        transformed[periods:] = values[periods:] - values[:-periods]
+    prefix = panel_transform_prefixes[method]
+    return(pd.DataFrame(transformed, index = panel.index,
+        columns = [prefix + str(column) for column in columns]))
+
+
+# Vector Autoregression (Python)
+
+# index labels for forecasts following the end of a time series
+# dates continue the inferred frequency, otherwise steps 1, 2, ...
+def _future_index(index, steps):
+    frequency = pd.infer_freq(index) \
+        if isinstance(index, pd.DatetimeIndex) and len(index) > 2 else None
+    if frequency is None:
+        return(np.arange(1, steps + 1))
+    return(pd.date_range(index[-1], periods = steps + 1,
+        freq = frequency)[1:])
+
+# lagged design matrix for a vector autoregression
+# rows are the observations following the first max_lags observations
+# columns are a constant followed by blocks of lag 1, lag 2, ... values
+def _var_design(values, lags, max_lags = None):
+    if max_lags is None:
+        max_lags = lags
+    n_obs, n_series = values.shape
+    design = np.empty((n_obs - max_lags, 1 + n_series * lags))
+    design[:, 0] = 1
+    for lag in range(1, lags + 1):
+        design[:, (1 + (lag - 1) * n_series):(1 + lag * n_series)] = \
+            values[(max_lags - lag):(n_obs - lag)]
+    return(design, values[max_lags:])
+
+# lag order selection for a vector autoregression
+# all candidate lag orders are fit to the same observations
+# with a single QR decomposition of the max_lags design matrix
+# because the design for p lags is the first 1 + k * p columns
+# input panel = data frame with one column per time series
+#       max_lags = largest lag order considered
+# output = data frame of AIC, BIC, and HQIC by lag order
+#          (the selected order has the smallest value)
+def select_var_order(panel, max_lags = 8):
+    values = np.asarray(panel, dtype = float)
+    n_series = values.shape[1]
+    design, response = _var_design(values, max_lags)
+    n_obs = len(response)
+    if design.shape[1] >= n_obs:
+        raise ValueError('too few observations for max_lags = ' +
+            str(max_lags))
+    q_matrix = np.linalg.qr(design)[0]
+    projection = q_matrix.T @ response
+    # explained cross-products accumulate one design column at a time
+    explained = np.cumsum(projection[:, :, np.newaxis] *
+        projection[:, np.newaxis, :], axis = 0)
+    lags = np.arange(max_lags + 1)
+    n_columns = 1 + n_series * lags
+    sigma = (response.T @ response - explained[n_columns - 1]) / n_obs
+    log_det = np.linalg.slogdet(sigma)[1]
+    n_params = n_series * n_columns
+    return(pd.DataFrame({'lags': lags,
+        'AIC': log_det + 2 * n_params / n_obs,
+        'BIC': log_det + np.log(n_obs) * n_params / n_obs,
+        'HQIC': log_det + 2 * np.log(np.log(n_obs)) * n_params / n_obs}))
+
+# vector autoregression fit by least squares
+# every equation is estimated in one solve against the stacked responses
+# input panel = data frame with one column per time series
+#       lags = lag order (for example, from select_var_order)
+# output = dictionary with intercept (k), coefs (lags x k x k) where
+#          coefs[l - 1][i, j] is the effect of series j at lag l on series i,
+#          residual covariance sigma (k x k), and the data needed to forecast
+def fit_var(panel, lags):
+    values = np.asarray(panel, dtype = float)
+    n_series = values.shape[1]
+    design, response = _var_design(values, lags)
+    estimates = np.linalg.lstsq(design, response, rcond = None)[0]
+    residuals = response - design @ estimates
+    sigma = residuals.T @ residuals / (len(response) - design.shape[1])
+    return({'names': list(panel.columns), 'index': panel.index,
+        'lags': lags, 'intercept': estimates[0],
+        'coefs': estimates[1:].reshape(lags, n_series, n_series)\
+            .transpose(0, 2, 1),
+        'sigma': sigma, 'residuals': residuals, 'values': values[-lags:]})
+
+# powers 0 through steps of the companion matrix of a fitted model
+def _var_companion_powers(var_fit, steps):
+    lags, n_series = var_fit['coefs'].shape[:2]
+    size = n_series * lags
+    companion = np.zeros((size, size))
+    companion[:n_series] = np.concatenate(var_fit['coefs'], axis = 1)
+    companion[n_series:, :(size - n_series)] = np.eye(size - n_series)
+    powers = np.empty((steps + 1, size, size))
+    powers[0] = np.eye(size)
+    for step in range(1, steps + 1):
+        powers[step] = powers[step - 1] @ companion
+    return(powers)
+
+# forecasts from a fitted vector autoregression
+# input var_fit = dictionary returned by fit_var
+#       steps = number of periods ahead
+# output = data frame of forecasts with one column per series
+def var_forecast(var_fit, steps):
+    n_series = len(var_fit['names'])
+    powers = _var_companion_powers(var_fit, steps)
+    # stacked state holds the most recent observation first
+    state = var_fit['values'][::-1].ravel()
+    constant = np.zeros(powers.shape[1])
+    constant[:n_series] = var_fit['intercept']
+    forecasts = powers[1:] @ state + \
+        np.cumsum(powers[:-1] @ constant, axis = 0)
+    return(pd.DataFrame(forecasts[:, :n_series],
+        index = _future_index(var_fit['index'], steps),
+        columns = var_fit['names']))
+
+# impulse response functions from a fitted vector autoregression
+# input var_fit = dictionary returned by fit_var
+#       steps = number of periods after the shock
+#       orthogonalized = True for shocks of one standard deviation
+#                        identified by the Cholesky factor of sigma
+# output = array (steps + 1) x k x k with [step, response, shock]
+def var_impulse_response(var_fit, steps = 10, orthogonalized = True):
+    n_series = len(var_fit['names'])
+    responses = \
+        _var_companion_powers(var_fit, steps)[:, :n_series, :n_series]
+    if orthogonalized:
+        responses = responses @ np.linalg.cholesky(var_fit['sigma'])
+    return(responses)
+
+
+# Seasonal Decomposition of Economic Time Series (Python)
+
+# recent decompositions keyed by data, period, and model
+_decomposition_cache = OrderedDict()
+_decomposition_cache_size = 32
+
+# classical decomposition of every series in a panel at once
+# series share the calendar of the panel index, so moving averages
+# and seasonal indices are computed as whole-array operations
+# results are cached, so repeated calls with the same data are free
+# input panel = data frame with one column per time series
+#       period = number of observations per seasonal cycle (12 for monthly)
+#       model = 'additive' or 'multiplicative'
+# output = dictionary of data frames (treat as read-only) with
+#          trend, seasonal, remainder, and seasonally_adjusted components
+def seasonal_decompose_panel(panel, period = 12, model = 'additive'):
+    if model not in ('additive', 'multiplicative'):
+        raise ValueError('unknown decomposition model: ' + str(model))
+    values = np.ascontiguousarray(panel, dtype = float)
+    digest = hashlib.sha1(values.tobytes())
+    digest.update(repr((list(panel.columns), values.shape)).encode())
+    digest.update(np.asarray(panel.index).tobytes())
+    key = (digest.hexdigest(), period, model)
+    if key in _decomposition_cache:
+        _decomposition_cache.move_to_end(key)
+        return(_decomposition_cache[key])
+
+    # centered moving average (2 x period for an even period)
+    if period % 2 == 0:
+        weights = np.r_[0.5, np.ones(period - 1), 0.5] / period
+    else:
+        weights = np.ones(period) / period
+    half = len(weights) // 2
+    trend = np.full(values.shape, np.nan)
+    trend[half:(len(values) - half)] = np.lib.stride_tricks\
+        .sliding_window_view(values, len(weights), axis = 0) @ weights
+
+    if model == 'additive':
+        detrended = values - trend
+    else:
+        detrended = values / trend
+
+    # average detrended values by position within the seasonal cycle
+    n_cycles = -(-len(values) // period)
+    padded = np.full((n_cycles * period, values.shape[1]), np.nan)
+    padded[:len(values)] = detrended
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category = RuntimeWarning)
+        indices = np.nanmean(padded.reshape(n_cycles, period, -1), axis = 0)
+    if model == 'additive':
+        indices = indices - indices.mean(axis = 0)
+        seasonal = np.tile(indices, (n_cycles, 1))[:len(values)]
+        remainder = values - trend - seasonal
+        adjusted = values - seasonal
+    else:
+        indices = indices / indices.mean(axis = 0)
+        seasonal = np.tile(indices, (n_cycles, 1))[:len(values)]
+        remainder = values / (trend * seasonal)
+        adjusted = values / seasonal
+
+    components = {}
+    for name, component in [('trend', trend), ('seasonal', seasonal),
+        ('remainder', remainder), ('seasonally_adjusted', adjusted)]:
+        components[name] = pd.DataFrame(component, index = panel.index,
+            columns = panel.columns)
+    _decomposition_cache[key] = components
+    if len(_decomposition_cache) > _decomposition_cache_size:
+        _decomposition_cache.popitem(last = False)
+    return(components)
+
+
+# Exponential Smoothing for Many Time Series (Python)
+
+# additive Holt-Winters recursions for many series and parameter sets
+# level, trend, and season states are arrays updated in lock-step
+# input values = observations (time x series)
+#       alpha, beta, gamma = smoothing parameters (candidates x series)
+#       trend = True to include a trend component
+#       period = number of seasons per cycle (None for no seasonality)
+# output = sum of squared one-step errors, final states, fitted values
+def _holt_winters_pass(values, alpha, beta, gamma, trend, period,
+    keep_fitted = False):
+    n_obs = len(values)
+    shape = np.broadcast(alpha, beta, gamma, values[0]).shape
+    # initial states from the first seasonal cycles
+    if period is None:
+        level = np.broadcast_to(values[0], shape).copy()
+        slope = np.broadcast_to(values[1] - values[0], shape).copy() \
+            if trend else np.zeros(shape)
+        season = np.zeros((1,) + shape)
+        position = np.zeros(n_obs, dtype = int)
+    else:
+        first_cycle = values[:period].mean(axis = 0)
+        level = np.broadcast_to(first_cycle, shape).copy()
+        if trend and n_obs >= 2 * period:
+            slope = np.broadcast_to((values[period:(2 * period)]\
+                .mean(axis = 0) - first_cycle) / period, shape).copy()
+        else:
+            slope = np.zeros(shape)
+        # seasonal deviations from cycle means averaged over four cycles
+        n_cycles = max(1, min(4, n_obs // period))
+        cycles = values[:(n_cycles * period)]\
+            .reshape(n_cycles, period, values.shape[1])
+        deviations = (cycles - cycles.mean(axis = 1, keepdims = True))\
+            .mean(axis = 0).reshape((period,) +
+            (1,) * (len(shape) - 1) + (values.shape[1],))
+        season = np.broadcast_to(deviations, (period,) + shape).copy()
+        position = np.arange(n_obs) % period
+    sse = np.zeros(shape)
+    fitted = np.empty((n_obs,) + shape) if keep_fitted else None
+    for t in range(n_obs):
+        seasonal = season[position[t]]
+        forecast = level + slope
+        if period is not None:
+            forecast = forecast + seasonal
+        error = values[t] - forecast
+        sse += error * error
+        if keep_fitted:
+            fitted[t] = forecast
+        previous_level = level
+        level = level + slope + alpha * error
+        if trend:
+            slope = slope + beta * (level - previous_level - slope)
+        if period is not None:
+            season[position[t]] = seasonal + \
+                gamma * (values[t] - level - seasonal)
+    return(sse, level, slope, season, fitted)
+
+# Holt-Winters exponential smoothing fit to every series in a panel
+# smoothing parameters are chosen for all series at once by a
+# coarse-to-fine search on the sum of squared one-step errors:
+# each round takes every parameter in turn, evaluates a grid of values
+# centered on each series' current best value, keeps the best, and
+# then the next round searches a grid four times narrower
+# input panel = data frame of complete series sharing a calendar
+#       period = number of seasons per cycle (None for no seasonality)
+#       trend = True to include an additive trend
+#       grid_size = number of candidate values per parameter per round
+#       n_rounds = number of grid refinements
+# output = dictionary with smoothing parameters, final states,
+#          fitted values, and the data needed to forecast
+def fit_exponential_smoothing(panel, period = None, trend = True,
+    grid_size = 9, n_rounds = 4):
+    values = np.asarray(panel, dtype = float)
+    if np.isnan(values).any():
+        raise ValueError('exponential smoothing requires complete series')
+    n_series = values.shape[1]
+    names = ['alpha'] + (['beta'] if trend else []) + \
+        (['gamma'] if period is not None else [])
+    best = {name: np.full(n_series, 0.5) for name in names}
+    offsets = np.linspace(-1, 1, grid_size)[:, np.newaxis]
+    width = 0.5
+    for round in range(n_rounds):
+        for name in names:
+            candidates = dict(best)
+            candidates[name] = np.clip(best[name] + width * offsets,
+                0.001, 0.999)
+            sse = _holt_winters_pass(values, candidates['alpha'],
+                candidates.get('beta', 0), candidates.get('gamma', 0),
+                trend, period)[0]
+            best[name] = candidates[name]\
+                [np.argmin(sse, axis = 0), np.arange(n_series)]
+        width = width / 4
+    parameters = best
+    sse, level, slope, season, fitted = _holt_winters_pass(values,
+        parameters['alpha'], parameters.get('beta', 0),
+        parameters.get('gamma', 0), trend, period, keep_fitted = True)
+    return({'names': list(panel.columns), 'index': panel.index,
+        'period': period, 'trend': trend,
+        'parameters': pd.DataFrame(parameters, index = panel.columns),
+        'sse': pd.Series(sse, index = panel.columns),
+        'level': level, 'slope': slope, 'season': season,
+        'fitted': pd.DataFrame(fitted, index = panel.index,
+            columns = panel.columns)})
+
+# forecasts from fitted exponential smoothing models
+# input es_fit = dictionary returned by fit_exponential_smoothing
+#       steps = number of periods ahead
+# output = data frame of forecasts with one column per series
+def exponential_smoothing_forecast(es_fit, steps):
+    horizon = np.arange(1, steps + 1)[:, np.newaxis]
+    forecasts = es_fit['level'] + horizon * es_fit['slope']
+    if es_fit['period'] is not None:
+        n_obs = len(es_fit['index'])
+        forecasts = forecasts + es_fit['season']\
+            [(n_obs + horizon.ravel() - 1) % es_fit['period']]
+    return(pd.DataFrame(forecasts,
+        index = _future_index(es_fit['index'], steps),
+        columns = es_fit['names']))
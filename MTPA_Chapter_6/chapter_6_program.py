@@ -7,28 +7,23 @@ from __future__ import division, print_function
 import pandas as pd  # data frame operations
 import numpy as np  # arrays and math functions
 import datetime
-from rpy2.robjects import r  # interface from Python to R
 
-# Erlang C queueing theory  
-# input c = number of servers (positive integer)
-#       r = ratio of arrival rate over service rate 
-# output = probability of waiting in queue (min 0, max 1)
+# import user-defined module
+# Erlang C queueing theory for arrays of queues
 # adapted from Pedro Canadilla (2014) function 
 # C_erlang in the R queueing package 
-def erlang_C (c = 1, r = 0):
-    if (c <= 0):
-        return(1)
-    if (r <= 0):
-        return(0)
-    c = int(c)    
-    tot = 1
-    for i in range(c-1):
-        i = i + 1
-        tot = 1 + (tot * i * (1/r))
-    return(max(0, min(1, (r * (1/tot)) / (c - (r * (1 - (1/tot)))))))
-    
+from chapter_6_utilities import servers_required, solve_shift_schedule,\
+    perturbation_scenarios, schedule_sensitivity, simulation_inputs,\
+    simulate_call_center, load_call_log, aggregate_call_logs,\
+    arrival_rate_table, wait_time_quantiles, plot_wait_time_ribbons,\
+    fit_arrival_model, forecast_staffing, shift_candidates,\
+    solve_shift_schedule_generated, staffing_array, staffing_table
+
 # focus upon February 1999
-call_center_input_data = pd.read_table('data_anonymous_bank_february.txt')
+# load_call_log declares column types, parses date and time of entry
+# into the call_time timestamp, adds call_hour and day_of_week,
+# and caches the typed data for later runs
+call_center_input_data = load_call_log('data_anonymous_bank_february.txt')
 # examine the structure of these data
 print(call_center_input_data.head)
 
@@ -43,14 +38,7 @@ call_center_data = call_center_data[call_center_data['vru_time'] >= 0]
 call_center_data['wait_time'] = call_center_data['vru_time'] + \
     call_center_data['q_time']
 
-# define date variable with apply and lambda function
-call_center_data['date'] = \
-    call_center_data['date']\
-    .apply(lambda d: datetime.datetime.strptime(str(d), '%y%m%d'))
-
-# define day of week as an integer 0 = Monday 6 = Sunday
-call_center_data['day_of_week'] = \
-    call_center_data['date'].apply(lambda d: d.weekday())
+# day of week is an integer 0 = Monday 6 = Sunday
 # use dictionary object for mapping day_of_week to string
 day_of_week_to_string = {0 : 'Monday', 
      1 : 'Tuesday', 
@@ -67,13 +55,7 @@ print(call_center_data.head)
 # examine frequency of calls by day of week
 print(call_center_data['day_of_week'].value_counts())
 
-# identify the hour of entry into the system
-call_center_data['vru_entry'] = \
-    call_center_data['vru_entry']\
-    .apply(lambda d: datetime.datetime.strptime(str(d), '%H:%M:%S'))
-call_center_data['call_hour'] = \
-    call_center_data['vru_entry'].apply(lambda d: d.hour)
-
+# the hour of entry into the system is call_hour
 # check frequency of calls in February by hour and day of week
 # note that pandas alphabetizes on output 
 print(pd.crosstab(call_center_data['day_of_week'],\
@@ -116,7 +98,17 @@ print(pd.crosstab(table_data['ordered_day_of_week'],\
     table_data['call_hour'], margins = False))
 
 # wait-time ribbons were created with R ggplot2 software
-# Python packages ggplot or rpy2 could be used for plotting
+# here quantiles of wait times (VRU time plus queue time) for all calls
+# are computed in one pass through the call logs, by day of week and hour
+wait_time_ribbons = wait_time_quantiles(['data_anonymous_bank_february.txt'],\
+    quantiles = [0.1, 0.25, 0.5, 0.75, 0.9], interval_minutes = 60)
+print(wait_time_ribbons.loc[2])  # Wednesday
+
+fig = plot_wait_time_ribbons(wait_time_ribbons, interval_minutes = 60)
+fig.savefig('fig_call_center_wait_time_ribbons_Python.pdf',
+    bbox_inches = 'tight', dpi=None, facecolor='w', edgecolor='b',
+    orientation='portrait', format=None,
+    transparent=True, pad_inches=0.25)
 
 # select Wednesdays in February for the queueing model
 wednesdays = call_center_data[call_center_data['day_of_week'] == \
@@ -129,10 +121,15 @@ check_hourly_arrival_rate = arrived_for_hour/4  # four Wednesdays in February 19
 print(check_hourly_arrival_rate)
 
 # organize hourly arrival rates according to 24-hour clock
-hourly_arrival_rate = [6.75, 1.75, 1.25, 0.00, 0.50, 0.25,\
-    4.75, 39.50, 97.25,107.50, 124.00,110.25, 95.50,\
-    203.50, 115.75, 115.50, 67.75, 75.00, 88.75,\
-    85.50, 68.00, 61.50, 57.50, 44.25]
+# call logs are read in chunks and reduced to counts by date, hour,
+# and call type... add more months of call logs to the list as needed
+call_counts = aggregate_call_logs(['data_anonymous_bank_february.txt'],\
+    interval_minutes = 60)
+arrival_rates = arrival_rate_table(call_counts, interval_minutes = 60,\
+    by = ['day_of_week', 'interval'])
+# Wednesday is day of week 2 (Monday is 0)
+hourly_arrival_rate = arrival_rates.loc[2, 'arrival_rate'].tolist()
+print(hourly_arrival_rate)
 
 # service times may vary hour-by-hour due to differences 
 # in service requests and individuals calling hour-by-hour
@@ -163,21 +160,13 @@ SERVICE_RATE = 15
 # use a target for the probability of waiting in queue to be 0.50
 PROBABILITY_GOAL = 0.50
 
-# Erlang C queueing calculations with Python erlang_C function
-# inputs c = number of servers
-#        r = ratio of rate of arrivals and rate of service
-# returns the propability of waiting in queue because all servers are busy
-# use while-loop iteration to determine the number of servers needed 
-# we do this for each hour of the day knowing the hourly arrival rate
-servers_needed = [0] * 24
-for index_for_hour in range(24):
-    if (hourly_arrival_rate[index_for_hour] > 0):
-        erlang_probability = 1 # initialize on entering while-loop
-        while (erlang_probability > PROBABILITY_GOAL):
-            servers_needed[index_for_hour] = servers_needed[index_for_hour] + 1
-            erlang_probability = \
-                erlang_C(c = servers_needed[index_for_hour],\
-                    r = hourly_arrival_rate[index_for_hour]/SERVICE_RATE)
+# Erlang C queueing calculations with Python servers_required function
+# inputs arrival rates, service rate, and target for the
+# probability of waiting in queue because all servers are busy
+# returns the number of servers needed for each hour of the day
+# computed for all twenty-four hours in one call
+servers_needed = servers_required(hourly_arrival_rate, SERVICE_RATE,\
+    target = 'probability_wait', goal = PROBABILITY_GOAL).tolist()
 print(servers_needed)  # check queueing theory result 
 # the result for servers.needed is obtained as
 # 1  1  1  0  1  1  1  4  8  9 10  9  8 16 10 10  6  7  8  8  6  6  5  4
@@ -187,14 +176,40 @@ for index_for_hour in range(6):
     servers_needed[index_for_hour] = 0
 print('\nHourly Operator Requirements:\n',servers_needed)
 
+# rather than averaging four Wednesdays, fit a Poisson regression
+# with day-of-week by hour effects and a trend across days
+# to the hourly call counts, and forecast staffing for next month
+arrival_model = fit_arrival_model(call_counts, interval_minutes = 60,\
+    trend = True)
+print('\nDaily trend in log arrival rate:', round(arrival_model['trend'], 5))
+march_staffing = forecast_staffing(arrival_model,\
+    pd.date_range('1999-03-01', '1999-03-31'), SERVICE_RATE,\
+    target = 'probability_wait', goal = PROBABILITY_GOAL)
+print('\nForecast Hourly Operator Requirements for March 1999:\n',\
+    march_staffing['servers_needed'].unstack())
+
+# requirements for every day of February by half hour and call type
+# each call type is treated as its own queue with its own service rate
+half_hour_counts = aggregate_call_logs(['data_anonymous_bank_february.txt'],\
+    interval_minutes = 30)
+february_staffing = staffing_array(half_hour_counts, interval_minutes = 30,\
+    target = 'probability_wait', goal = PROBABILITY_GOAL)
+print('\nStaffing array (days x half hours x call types):',\
+    february_staffing['servers'].shape, february_staffing['queues'])
+february_staffing_table = staffing_table(february_staffing)
+print('\nServer half hours needed by date and call type:\n',\
+    february_staffing_table.pivot_table('servers', index = 'date',\
+    columns = 'queue', aggfunc = 'sum', observed = False))
+february_staffing_table.to_csv('call_center_february_staffing.csv',\
+    index = False)
+
 # read in case data for the structure of call center worker shifts
 bank_shifts_data_frame = pd.read_csv("data_anonymous_bank_shifts.csv")
 # examine the structure of these data
 print(bank_shifts_data_frame.head)
 
 # constraint matrix as required for mathematical programming
-constraint_matrix = np.array(bank_shifts_data_frame)[:,2:]
-# we will create this type of object on the R side as well
+constraint_matrix = np.array(bank_shifts_data_frame.iloc[:,2:], dtype = int)
 
 # six-hour shift salaries in Israeli sheqels 
 # 1 ILS = 3.61 USD in June 2013
@@ -202,52 +217,80 @@ constraint_matrix = np.array(bank_shifts_data_frame)[:,2:]
 # with the objective of minimizing total costs
 cost_vector = [252, 288, 180, 180, 180, 288, 288, 288] 
 
-# install lpsolove package and drivers for Python 
-# noting the operating system being used
-# or use rpy2 access to lpSolve in R as shown here
-
-# assign lists from Python to R using rpy2
-r.assign('servers_needed_R', servers_needed)
-r.assign('cost_vector_R', cost_vector)
-
-r('bank.shifts.data.frame <- read.csv("data_anonymous_bank_shifts.csv")')
-r('constraint_matrix_R <- as.matrix(bank.shifts.data.frame[,3:10])')
-
-# check mathematical programming inputs on the R side
-r('print(as.numeric(unlist(servers_needed_R)))')
-r('print(as.numeric(unlist(cost_vector_R)))')
-r('print(constraint_matrix_R)')
-
-# solve the mathematical programming problem
-r('library(lpSolve)')  
-r('call_center_schedule <- lp(const.mat=constraint_matrix_R,\
-    const.rhs = as.numeric(unlist(servers_needed_R)),\
-    const.dir = rep(">=", times = 8),\
-    int.vec = 1:8,\
-    objective = as.numeric(unlist(cost_vector_R)),\
-    direction = "min")')
-    
+# solve the integer programming problem in Python with scipy
+# minimizing total cost subject to hourly operator requirements
+call_center_schedule, call_center_coverage = \
+    solve_shift_schedule(servers_needed, constraint_matrix, cost_vector,\
+    shift_names = list(bank_shifts_data_frame.columns[2:]),\
+    period_names = list(bank_shifts_data_frame['StartTime']))
+
 # prepare summary of the results for the call center problem
-# working on the R side
-r('ShiftID <- 1:8')
-r('StartTime <- c(0,6,8,10,12,2,4,6)')
+call_center_summary = pd.DataFrame({'ShiftID': range(1, 9),\
+    'StartTime': [0, 6, 8, 10, 12, 2, 4, 6],\
+    'ShiftDuration': [6] * 8,\
+    'HourlyShiftSalary': [42, 48, 30, 30, 30, 48, 48, 48],\
+    'HourlyShiftCost': call_center_schedule['ShiftCost'],\
+    'Solution': call_center_schedule['Solution'],\
+    'ShiftCost': call_center_schedule['TotalCost']},\
+    columns = ['ShiftID', 'StartTime', 'ShiftDuration',\
+    'HourlyShiftSalary', 'HourlyShiftCost', 'Solution', 'ShiftCost'])
 # c("Midnight","6 AM","8 AM","10 AM","Noon","2 PM","4 PM","6 PM")
-r('ShiftDuration <- rep(6,times=8)')
-r('HourlyShiftSalary <- c(42,48,30,30,30,48,48,48)')
-r('HourlyShiftCost <- call_center_schedule$objective') # six x hourly shift salary
-r('Solution <- call_center_schedule$solution')  
-r('ShiftCost <- call_center_schedule$solution * call_center_schedule$objective')
-r('call_center_summary <- \
-  data.frame(ShiftID,StartTime,ShiftDuration,HourlyShiftSalary,\
-  HourlyShiftCost,Solution,ShiftCost)')
-r('cat("\n\n","Call Center Summary","\n\n")')
-r('print(call_center_summary)')
-r('print(call_center_schedule)')
-
-# alternatively... bring the solution from R to Python
-# and print the minimum-cost solution on the Python side
-call_center_schedule = r('call_center_schedule')
-print(call_center_schedule)
+print('\n\nCall Center Summary\n')
+print(call_center_summary)
+print('\nMinimum Total Cost:', call_center_summary['ShiftCost'].sum())
+print('\nHourly Coverage:\n', call_center_coverage)
+
+# the eight six-hour shifts are a small part of the shifts possible
+# consider shifts of four, six, and eight hours starting at any
+# quarter hour of the first week of March, with unpaid breaks placed
+# within a window of each longer shift, and requirements by quarter hour
+# from the forecast staffing plan (still closed hours 00 through 05)
+weekly_servers_needed = march_staffing['servers_needed']\
+    .loc['1999-03-01':'1999-03-07'].to_numpy().reshape(7, 24).copy()
+weekly_servers_needed[:, :6] = 0
+weekly_servers_needed = np.repeat(weekly_servers_needed, 4, axis = 1).ravel()
+weekly_shift_types = pd.DataFrame({'hours': [4, 6, 8],\
+    'break_hours': [0, 0.5, 1], 'break_earliest': [0, 2, 3],\
+    'break_latest': [0, 4, 5], 'hourly_cost': [36, 32, 30]})
+weekly_candidates = shift_candidates(len(weekly_servers_needed), 15,\
+    weekly_shift_types, start_step = 1, cyclic = True)
+print('\nCandidate shifts for the week:', len(weekly_candidates))
+weekly_schedule, weekly_coverage, weekly_bound = \
+    solve_shift_schedule_generated(weekly_servers_needed, weekly_candidates)
+print('\nWeekly Schedule (start in quarter hours from Monday midnight):\n',\
+    weekly_schedule)
+print('\nMinimum Total Cost for the Week:',\
+    weekly_schedule['total_cost'].sum(),\
+    '(lower bound', round(weekly_bound, 2), ')')
+
+# discrete event simulation to validate the Erlang C staffing
+# arrivals by day of week and hour, service times, and customer patience
+# are drawn from the February call log, with servers on duty according
+# to the optimal shift schedule... independent replications of a
+# four-week month run in parallel from reproducible random streams
+if __name__ == '__main__':
+    call_center_simulation = simulate_call_center(\
+        simulation_inputs(call_center_data),\
+        staffing = call_center_coverage['Scheduled'],\
+        n_days = 28, n_replications = 20, seed = 1234)
+    print('\nSimulated Waiting Times (seconds) and Abandonment\n')
+    print(call_center_simulation.describe().T)
+
+# sensitivity test varying the workforce requirements
+# through the probability of waiting goal and the level of demand
+# with scenarios solved across processes, each warm-started
+# from the solution of the scenario before it
+if __name__ == '__main__':
+    sensitivity_scenarios = perturbation_scenarios(hourly_arrival_rate,\
+        SERVICE_RATE, cost_vector,\
+        probability_goals = [0.3, 0.4, 0.5, 0.6, 0.7],\
+        demand_multipliers = [0.8, 0.9, 1.0, 1.1, 1.2],\
+        closed_periods = range(6))
+    sensitivity_results = \
+        schedule_sensitivity(sensitivity_scenarios, constraint_matrix)
+    print('\nMinimum Total Cost by Probability Goal and Demand Level\n')
+    print(sensitivity_results.pivot_table(index = 'probability_goal',\
+        columns = 'demand_multiplier', values = 'total_cost'))
 
 # Suggestion for the student:
 # Attack the problem using discrete event simulation, 
@@ -0,0 +1,978 @@
+# Utilities for Workforce Scheduling (Python)
+
+import os  # number of processors available
+import heapq  # event queue for discrete event simulation
+import itertools  # grids of scenario settings
+from concurrent.futures import ProcessPoolExecutor  # parallel processing
+import numpy as np  # arrays and math functions
+import pandas as pd  # data frame operations
+from scipy.optimize import milp, linprog, LinearConstraint, Bounds
+from scipy.sparse import csc_matrix, hstack, identity  # shift patterns
+
+
+# Loading the Bank Call Center Data (Python)
+
+# column types for the tab-delimited call log files
+# dates and times are read as categories so that each distinct
+# value is parsed once rather than once for every call
+call_log_dtypes = {'vru+line': 'category', 'call_id': 'int64',
+    'customer_id': 'float64', 'priority': 'category', 'type': 'category',
+    'date': 'category', 'vru_entry': 'category', 'vru_exit': 'category',
+    'vru_time': 'int32', 'q_start': 'category', 'q_exit': 'category',
+    'q_time': 'int32', 'outcome': 'category', 'ser_start': 'category',
+    'ser_exit': 'category', 'ser_time': 'int32', 'server': 'category'}
+
+# typed date, timestamp, hour, and day of week for a block of calls
+# date (yymmdd) plus vru_entry (h:mm:ss) becomes the call_time timestamp,
+# call_hour is 0 to 23, and day_of_week is 0 = Monday through 6 = Sunday
+def _prepare_call_log(calls):
+    date_codes = calls['date'].cat.codes.to_numpy()
+    dates = pd.to_datetime(calls['date'].cat.categories.astype(str),
+        format = '%y%m%d')
+    entry_codes = calls['vru_entry'].cat.codes.to_numpy()
+    entries = pd.to_timedelta(calls['vru_entry'].cat.categories.astype(str))
+    calls['date'] = dates.to_numpy()[date_codes]
+    calls['call_time'] = calls['date'].to_numpy() + \
+        entries.to_numpy()[entry_codes]
+    calls['call_hour'] = (entries.to_numpy()[entry_codes] //
+        np.timedelta64(1, 'h')).astype('int8')
+    calls['day_of_week'] = dates.dayofweek.to_numpy()\
+        .astype('int8')[date_codes]
+    return(calls)
+
+# declared categorical columns as categories, whether freshly parsed
+# or read from the cache... Parquet stores integer categories (priority)
+# as plain integers, and pyarrow parses them as nullable integers, so
+# integer categories are made ordinary int64 in both cases
+def _call_log_categories(calls):
+    for column, dtype in call_log_dtypes.items():
+        if dtype != 'category' or column not in calls.columns:
+            continue
+        if not isinstance(calls[column].dtype, pd.CategoricalDtype):
+            calls[column] = calls[column].astype('category')
+        categories = calls[column].cat.categories
+        if pd.api.types.is_integer_dtype(categories.dtype):
+            calls[column] = calls[column].cat.rename_categories(
+                categories.astype('int64'))
+    return(calls)
+
+# read a call log into a typed data frame with a binary cache
+# when pyarrow is installed it parses the text file and the cache is
+# written beside the call log as a Parquet file (otherwise the pandas
+# parser and a pickle file are used)... the cache is reused until
+# the call log is modified
+# input path = tab-delimited call log (data_anonymous_bank_*.txt)
+#       cache = True to read and write the binary cache
+# output = data frame of calls with categorical outcome, type, server,
+#          and priority, plus call_time, call_hour, and day_of_week
+def load_call_log(path, cache = True):
+    try:
+        import pyarrow  # multithreaded parsing and Parquet columnar storage
+        engine, cache_path = 'pyarrow', path + '.parquet'
+    except ImportError:
+        engine, cache_path = 'c', path + '.pkl'
+    if cache and os.path.exists(cache_path) and \
+        os.path.getmtime(cache_path) >= os.path.getmtime(path):
+        if cache_path.endswith('.parquet'):
+            return(_call_log_categories(pd.read_parquet(cache_path)))
+        return(_call_log_categories(pd.read_pickle(cache_path)))
+    calls = _call_log_categories(_prepare_call_log(pd.read_csv(path,
+        sep = '\t', dtype = call_log_dtypes, engine = engine)))
+    if cache:
+        if cache_path.endswith('.parquet'):
+            calls.to_parquet(cache_path)
+        else:
+            calls.to_pickle(cache_path)
+    return(calls)
+
+
+# Aggregating Call Logs into Arrival and Service Tables (Python)
+
+# columns needed to count arrivals and service times
+call_count_columns = ['type', 'date', 'vru_entry', 'vru_time', 'q_time',
+    'outcome', 'ser_time', 'server']
+
+# read call logs a chunk at a time, dropping PHANTOM calls and
+# calls with negative VRU times and adding the time interval of entry
+# (interval k begins k * interval_minutes after midnight)
+def _call_log_chunks(paths, interval_minutes, chunksize):
+    dtypes = dict((column, call_log_dtypes[column])
+        for column in call_count_columns)
+    for path in paths:
+        for chunk in pd.read_csv(path, sep = '\t', usecols =
+            call_count_columns, dtype = dtypes, chunksize = chunksize):
+            chunk = chunk[(chunk['outcome'] != 'PHANTOM') &
+                (chunk['vru_time'] >= 0)]
+            chunk = _prepare_call_log(chunk.copy())
+            chunk['interval'] = ((chunk['call_time'] - chunk['date']) //
+                np.timedelta64(interval_minutes, 'm')).astype('int16')
+            yield chunk
+
+# stream call logs in chunks into counts by date and time interval
+# only the (small) table of counts is held in memory
+# input paths = list of tab-delimited call log files (any number of months)
+#       interval_minutes = length of time intervals (60, 30, 15, ...)
+#       chunksize = number of calls read at a time
+# output = data frame indexed by date, day_of_week, interval, and type
+#          with calls arrived, calls served, and total service time
+#          (no rows if there are no calls)
+def aggregate_call_logs(paths, interval_minutes = 60, chunksize = 100000):
+    keys = ['date', 'day_of_week', 'interval', 'type']
+    call_counts = None
+    for chunk in _call_log_chunks(paths, interval_minutes, chunksize):
+        chunk['type'] = chunk['type'].astype(str)
+        chunk['served'] = (chunk['server'] != 'NO_SERVER').astype('int64')
+        chunk['ser_time_sum'] = chunk['ser_time'].astype('int64') * \
+            chunk['served']
+        counts = chunk.groupby(keys).agg(arrived = ('served', 'size'),
+            served = ('served', 'sum'),
+            ser_time_sum = ('ser_time_sum', 'sum'))
+        call_counts = counts if call_counts is None else \
+            call_counts.add(counts, fill_value = 0).astype('int64')
+    if call_counts is None:
+        call_counts = pd.DataFrame(
+            {'arrived': pd.Series(dtype = 'int64'),
+                'served': pd.Series(dtype = 'int64'),
+                'ser_time_sum': pd.Series(dtype = 'int64')},
+            index = pd.MultiIndex.from_tuples([], names = keys))
+    return(call_counts.sort_index())
+
+# average arrival and service rates per hour from aggregated counts
+# averages are taken over all dates with calls in the table, so that
+# intervals without calls count as zero arrivals
+# input call_counts = data frame from aggregate_call_logs
+#       interval_minutes = interval length used in aggregate_call_logs
+#       by = keys defining rows ('date', 'day_of_week', 'interval', 'type')
+#       types = call types to include (default is all types)
+#       wrap_up = seconds a server is unavailable after each call
+# output = data frame with arrival_rate (calls per hour), mean_service_time
+#          (seconds), and service_rate (calls per server per hour),
+#          ready for use with servers_required
+def arrival_rate_table(call_counts, interval_minutes = 60,
+    by = ['day_of_week', 'interval'], types = None, wrap_up = 60):
+    counts = call_counts.reset_index()
+    dates = counts[['date', 'day_of_week']].drop_duplicates()
+    if types is not None:
+        counts = counts[counts['type'].isin(types)]
+    table = counts.groupby(by)[['arrived', 'served', 'ser_time_sum']].sum()
+    if 'interval' in by:
+        levels = [np.arange(24 * 60 // interval_minutes)
+            if key == 'interval' else table.index.unique(key)
+            for key in by]
+        table = table.reindex(pd.MultiIndex.from_product(levels,
+            names = by) if len(by) > 1 else levels[0], fill_value = 0)
+    if 'date' in by:
+        n_days = 1
+    elif 'day_of_week' in by:
+        n_days = table.index.get_level_values('day_of_week')\
+            .map(dates['day_of_week'].value_counts()).to_numpy()
+    else:
+        n_days = len(dates)
+    table['arrival_rate'] = table['arrived'] / n_days * \
+        (60 / interval_minutes)
+    table['mean_service_time'] = \
+        table['ser_time_sum'] / table['served'].replace(0, np.nan)
+    table['service_rate'] = 3600 / (table['mean_service_time'] + wrap_up)
+    return(table[['arrival_rate', 'mean_service_time', 'service_rate']])
+
+
+# Forecasting Arrivals by Poisson Regression (Python)
+
+# Poisson regression for calls arriving by day of week and time interval
+#     log(expected calls) = effect(day of week, interval) + trend * day
+# counts are reduced to one row per date and interval (zero for intervals
+# without calls) and the model is fit by iteratively reweighted least
+# squares... the weighted normal equations are one diagonal block for the
+# day-of-week by interval effects plus the trend column, so each
+# iteration is solved in closed form with bincount sums
+# input call_counts = data frame from aggregate_call_logs
+#       interval_minutes = interval length used in aggregate_call_logs
+#       types = call types to include (default is all types)
+#       trend = True to include a linear trend in log rate over days
+#       max_iter = largest number of iterations
+#       tol = convergence tolerance for relative change in deviance
+# output = dictionary with effects (7 x intervals array of log expected
+#          calls on start_date, -inf where no calls were observed),
+#          trend (change in log expected calls per day), start_date,
+#          interval_minutes, deviance, and iterations
+def fit_arrival_model(call_counts, interval_minutes = 60, types = None,
+    trend = True, max_iter = 50, tol = 1e-10):
+    counts = call_counts.reset_index()
+    dates = pd.DatetimeIndex(np.sort(counts['date'].unique()))
+    if types is not None:
+        counts = counts[counts['type'].isin(types)]
+    n_intervals = 24 * 60 // interval_minutes
+    n_cells = 7 * n_intervals
+    y = np.zeros((len(dates), n_intervals))
+    np.add.at(y, (dates.get_indexer(counts['date']),
+        counts['interval'].to_numpy()), counts['arrived'].to_numpy())
+    cell = (dates.dayofweek.to_numpy()[:, np.newaxis] * n_intervals +
+        np.arange(n_intervals)).ravel()
+    t = np.repeat((dates - dates[0]).days.to_numpy(dtype = float),
+        n_intervals)
+    y = y.ravel()
+    # effects of cells without calls are -inf and left out of the fit
+    cell_total = np.bincount(cell, y, minlength = n_cells)
+    active = cell_total > 0
+    effects = np.full(n_cells, -np.inf)
+    effects[active] = np.log(cell_total[active] /
+        np.bincount(cell, minlength = n_cells)[active])
+    keep = active[cell]
+    y, cell, t = y[keep], cell[keep], t[keep]
+    slope = 0.0
+    deviance = np.inf
+    for iteration in range(1, max_iter + 1):
+        eta = effects[cell] + slope * t
+        mu = np.exp(eta)
+        z = eta + (y - mu) / mu
+        w_c = np.bincount(cell, mu, minlength = n_cells)[active]
+        wz_c = np.bincount(cell, mu * z, minlength = n_cells)[active]
+        if trend:
+            wt_c = np.bincount(cell, mu * t, minlength = n_cells)[active]
+            slope = (np.sum(mu * t * z) - np.sum(wt_c * wz_c / w_c)) / \
+                (np.sum(mu * t * t) - np.sum(wt_c * wt_c / w_c))
+            effects[active] = (wz_c - wt_c * slope) / w_c
+        else:
+            effects[active] = wz_c / w_c
+        mu = np.exp(effects[cell] + slope * t)
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            new_deviance = 2 * np.sum(np.where(y > 0,
+                y * np.log(y / mu), 0) - (y - mu))
+        converged = abs(deviance - new_deviance) < \
+            tol * (abs(new_deviance) + 0.1)
+        deviance = new_deviance
+        if converged:
+            break
+    return({'effects': effects.reshape(7, n_intervals), 'trend': slope,
+        'start_date': dates[0], 'interval_minutes': interval_minutes,
+        'deviance': deviance, 'iterations': iteration})
+
+# expected calls per hour from a fitted arrival model for any dates
+# input arrival_model = dictionary from fit_arrival_model
+#       dates = dates to forecast (for example, next month)
+# output = data frame indexed by date and interval
+#          with day_of_week and arrival_rate (calls per hour)
+def forecast_arrival_rates(arrival_model, dates):
+    dates = pd.DatetimeIndex(dates).normalize()
+    interval_minutes = arrival_model['interval_minutes']
+    n_intervals = arrival_model['effects'].shape[1]
+    day = (dates - arrival_model['start_date']).days.to_numpy()
+    log_rate = arrival_model['effects'][dates.dayofweek.to_numpy()] + \
+        arrival_model['trend'] * day[:, np.newaxis]
+    forecast = pd.DataFrame({
+        'day_of_week': np.repeat(dates.dayofweek.to_numpy(), n_intervals),
+        'arrival_rate': np.exp(log_rate).ravel() * 60 / interval_minutes},
+        index = pd.MultiIndex.from_product([dates, np.arange(n_intervals)],
+        names = ['date', 'interval']))
+    return(forecast)
+
+# staffing plan for any dates from a fitted arrival model
+# forecasts arrival rates and finds servers needed for all dates
+# and intervals together with servers_required
+# input arrival_model = dictionary from fit_arrival_model
+#       dates = dates to plan (for example, next month)
+#       service_rate = calls completed per server per hour
+#       target, goal, answer_time = staffing goal as in servers_required
+#                                   (times in hours)
+# output = data frame from forecast_arrival_rates with servers_needed
+def forecast_staffing(arrival_model, dates, service_rate,
+    target = 'probability_wait', goal = 0.5, answer_time = 0):
+    plan = forecast_arrival_rates(arrival_model, dates)
+    plan['servers_needed'] = servers_required(plan['arrival_rate'],
+        service_rate, target = target, goal = goal,
+        answer_time = answer_time)
+    return(plan)
+
+
+# Wait-Time Quantile Ribbons (Python)
+
+# quantiles of wait times by day of week and time interval, where
+# wait time is VRU time plus queue time (as in the chapter), for all
+# calls unless served_only... queue_only gives queue time alone
+# computed in one pass over the call logs with a histogram sketch:
+# wait times are whole seconds, so counts per second of wait give
+# exact quantiles in memory that does not grow with the number of calls
+# input paths = list of tab-delimited call log files (any number of months)
+#       quantiles = probabilities for the ribbon bands
+#       interval_minutes = length of time intervals (60, 30, 15, ...)
+#       max_wait = waits longer than this many seconds are reported
+#                  as max_wait (the sketch keeps one bin for them)
+#       served_only = True to use only calls that reached a server
+#       queue_only = True for queue time alone (without VRU time)
+#       chunksize = number of calls read at a time
+# output = data frame indexed by day_of_week (Monday is 0) and interval
+#          with number of calls and one column per quantile (q10, q50, ...)
+def wait_time_quantiles(paths, quantiles = [0.1, 0.25, 0.5, 0.75, 0.9],
+    interval_minutes = 60, max_wait = 3600, served_only = False,
+    queue_only = False, chunksize = 100000):
+    n_intervals = 24 * 60 // interval_minutes
+    n_bins = max_wait + 2
+    sketch = np.zeros(7 * n_intervals * n_bins, dtype = np.int64)
+    for chunk in _call_log_chunks(paths, interval_minutes, chunksize):
+        if served_only:
+            chunk = chunk[chunk['server'] != 'NO_SERVER']
+        cell = chunk['day_of_week'].to_numpy(np.int64) * n_intervals + \
+            chunk['interval'].to_numpy(np.int64)
+        wait = chunk['q_time'].to_numpy(np.int64)
+        if not queue_only:
+            wait = wait + chunk['vru_time'].to_numpy(np.int64)
+        wait = np.clip(wait, 0, max_wait + 1)
+        sketch += np.bincount(cell * n_bins + wait, minlength = sketch.size)
+    cumulative = sketch.reshape(7 * n_intervals, n_bins).cumsum(axis = 1)
+    calls = cumulative[:, -1]
+    ribbons = pd.DataFrame({'calls': calls}, index =
+        pd.MultiIndex.from_product([np.arange(7), np.arange(n_intervals)],
+        names = ['day_of_week', 'interval']))
+    for q in quantiles:
+        # smallest wait with at least proportion q of calls at or below it
+        wait = (cumulative < q * calls[:, np.newaxis]).sum(axis = 1)
+        ribbons['q%g' % (100 * q)] = np.where(calls > 0,
+            np.minimum(wait, max_wait), np.nan)
+    return(ribbons)
+
+# plot wait-time ribbons, one panel per day of week, with nested bands
+# between outer and inner quantiles and a line for the middle quantile
+# input ribbons = data frame from wait_time_quantiles
+#       interval_minutes = interval length used in wait_time_quantiles
+#       days = days of week to plot (Monday is 0)
+#       wait_label = axis label for the wait time measure
+# output = matplotlib figure
+def plot_wait_time_ribbons(ribbons, interval_minutes = 60,
+    days = [0, 1, 2, 3, 4, 5, 6],
+    wait_label = 'VRU + Queue Wait (seconds)'):
+    import matplotlib.pyplot as plt
+    day_names = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday',
+        'Saturday', 'Sunday']
+    bands = [column for column in ribbons.columns if column != 'calls']
+    fig, axes = plt.subplots(len(days), 1, sharex = True, sharey = True,
+        figsize = (8, 2 * len(days)), squeeze = False)
+    for axis, day in zip(axes[:, 0], days):
+        # repeat the last interval so that steps run to the end of the day
+        day_ribbons = ribbons.loc[day]
+        day_ribbons = pd.concat([day_ribbons, day_ribbons.iloc[-1:]])
+        hours = np.append(day_ribbons.index.to_numpy()[:-1],
+            len(day_ribbons) - 1) * interval_minutes / 60
+        for k in range(len(bands) // 2):
+            axis.fill_between(hours, day_ribbons[bands[k]],
+                day_ribbons[bands[-(k + 1)]], step = 'post', color = 'grey',
+                alpha = 0.3 + 0.3 * k, linewidth = 0)
+        if len(bands) % 2 == 1:
+            axis.step(hours, day_ribbons[bands[len(bands) // 2]],
+                where = 'post', color = 'black')
+        axis.set_ylabel(wait_label)
+        axis.set_title(day_names[day], fontsize = 10)
+    axes[-1, 0].set_xlabel('Hour of Day')
+    axes[-1, 0].set_xlim(0, 24)
+    return(fig)
+
+
+# Erlang C Queueing Calculations for Many Queues (Python)
+
+# Erlang C probability of waiting for arrays of queues
+# uses the numerically stable Erlang B recursion
+#     B(0) = 1, B(k) = r B(k-1) / (k + r B(k-1))
+# with C = c B / (c - r (1 - B)) for c > r (otherwise all calls wait)
+# input c = numbers of servers (non-negative integers)
+#       r = ratios of arrival rate over service rate
+# output = array of probabilities of waiting in queue (min 0, max 1)
+def erlang_C_array(c, r):
+    c, r = np.broadcast_arrays(np.asarray(c, dtype = int),
+        np.asarray(r, dtype = float))
+    erlang_B = np.ones(c.shape)
+    for k in range(1, int(c.max(initial = 0)) + 1):
+        erlang_B = np.where(k <= c,
+            r * erlang_B / (k + r * erlang_B), erlang_B)
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        probability = np.where(c > r,
+            c * erlang_B / (c - r * (1 - erlang_B)), 1.0)
+    probability = np.where(r <= 0, 0.0, probability)
+    return(np.where(c <= 0, 1.0, np.clip(probability, 0, 1)))
+
+# numbers of servers needed to meet a service goal for arrays of queues
+# the Erlang B recursion is carried forward one server at a time for all
+# queues together, so each queue's requirement is found in a single pass
+# input arrival_rate = calls arriving per unit of time
+#       service_rate = calls completed per server per unit of time
+#       target = 'probability_wait' for probability of waiting <= goal
+#                'asa' for average speed of answer <= goal
+#                'service_level' for proportion of calls answered
+#                                within answer_time >= goal
+#       goal = probability or time (same time units as the rates)
+#       answer_time = acceptable wait for 'service_level' target
+#       max_servers = largest number of servers considered per queue
+# output = array of numbers of servers (zero where no calls arrive)
+def servers_required(arrival_rate, service_rate,
+    target = 'probability_wait', goal = 0.5, answer_time = 0,
+    max_servers = 10000):
+    if target not in ('probability_wait', 'asa', 'service_level'):
+        raise ValueError('unknown staffing target: ' + str(target))
+    arrival_rate, service_rate, goal, answer_time = np.broadcast_arrays(
+        np.asarray(arrival_rate, dtype = float),
+        np.asarray(service_rate, dtype = float),
+        np.asarray(goal, dtype = float),
+        np.asarray(answer_time, dtype = float))
+    r = arrival_rate / service_rate
+    servers = np.zeros(r.shape, dtype = int)
+    unsolved = r > 0
+    erlang_B = np.ones(r.shape)
+    k = 0
+    while unsolved.any():
+        k = k + 1
+        if k > max_servers:
+            raise ValueError('goal not met with max_servers = ' +
+                str(max_servers))
+        erlang_B = r * erlang_B / (k + r * erlang_B)
+        stable = unsolved & (k > r)
+        if not stable.any():
+            continue
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            erlang_C = k * erlang_B / (k - r * (1 - erlang_B))
+            spare_rate = k * service_rate - arrival_rate
+            if target == 'probability_wait':
+                met = erlang_C <= goal
+            elif target == 'asa':
+                met = erlang_C / spare_rate <= goal
+            else:
+                met = 1 - erlang_C * np.exp(-spare_rate * answer_time) \
+                    >= goal
+        met = stable & met
+        servers[met] = k
+        unsolved = unsolved & ~met
+    return(servers)
+
+
+# Staffing Requirements for Every Day and Interval of a Month (Python)
+
+# servers needed by date, time interval, and queue from observed calls
+# arrival rates for all dates, intervals, and queues are arranged in one
+# array, and requirements for all of them come from one call to
+# servers_required... each queue has its own service rate from the
+# service times of its calls
+# input call_counts = data frame from aggregate_call_logs
+#       interval_minutes = interval length used in aggregate_call_logs
+#       queues = dictionary of queue names and lists of call types
+#                (default is one queue for each call type)
+#       target, goal, answer_time = staffing goal as in servers_required
+#                                   (times in hours)
+#       wrap_up = seconds a server is unavailable after each call
+# output = dictionary with servers (dates x intervals x queues array),
+#          arrival_rate (calls per hour, same shape), service_rate
+#          (calls per server per hour for each queue), dates, queues,
+#          and interval_minutes
+def staffing_array(call_counts, interval_minutes = 60, queues = None,
+    target = 'probability_wait', goal = 0.5, answer_time = 0,
+    wrap_up = 60):
+    counts = call_counts.reset_index()
+    if queues is None:
+        queues = dict((call_type, [call_type])
+            for call_type in np.sort(counts['type'].unique()))
+    queue_of_type = dict((call_type, index)
+        for index, call_types in enumerate(queues.values())
+        for call_type in call_types)
+    counts = counts[counts['type'].isin(queue_of_type)]
+    queue = counts['type'].map(queue_of_type).to_numpy(dtype = int)
+    dates = pd.date_range(counts['date'].min(), counts['date'].max())
+    n_intervals = 24 * 60 // interval_minutes
+    arrived = np.zeros((len(dates), n_intervals, len(queues)))
+    np.add.at(arrived, (dates.get_indexer(counts['date']),
+        counts['interval'].to_numpy(), queue), counts['arrived'].to_numpy())
+    served = np.bincount(queue, counts['served'], minlength = len(queues))
+    ser_time_sum = np.bincount(queue, counts['ser_time_sum'],
+        minlength = len(queues))
+    # queues without served calls take the service time of all calls
+    mean_service_time = np.where(served > 0,
+        ser_time_sum / np.maximum(served, 1), ser_time_sum.sum() /
+        served.sum())
+    service_rate = 3600 / (mean_service_time + wrap_up)
+    arrival_rate = arrived * (60 / interval_minutes)
+    servers = servers_required(arrival_rate, service_rate, target = target,
+        goal = goal, answer_time = answer_time)
+    return({'servers': servers.astype(np.int16),
+        'arrival_rate': arrival_rate, 'service_rate': service_rate,
+        'dates': dates, 'queues': list(queues),
+        'interval_minutes': interval_minutes})
+
+# long data frame of staffing requirements for export
+# only date, interval, and queue combinations needing servers are kept
+# input staffing = dictionary from staffing_array
+# output = data frame with date, interval, start time, queue,
+#          arrival_rate, and servers
+def staffing_table(staffing):
+    day, interval, queue = np.nonzero(staffing['servers'])
+    return(pd.DataFrame({'date': staffing['dates'][day],
+        'interval': interval.astype(np.int16),
+        'start_time': pd.to_timedelta(interval *
+            staffing['interval_minutes'], unit = 'm'),
+        'queue': pd.Categorical.from_codes(queue, staffing['queues']),
+        'arrival_rate': staffing['arrival_rate'][day, interval, queue],
+        'servers': staffing['servers'][day, interval, queue]}))
+
+
+# Shift Scheduling by Integer Programming (Python)
+
+# minimum-cost assignment of workers to shifts
+# minimize total cost subject to constraint_matrix x >= servers_needed
+# with x non-negative integers, solved by HiGHS branch and bound in scipy
+# input servers_needed = workers required in each period
+#       constraint_matrix = periods x shifts with 1 where a shift
+#                           covers a period and 0 otherwise
+#       cost_vector = cost of one worker on each shift
+#       shift_names, period_names = optional labels for output
+# output = schedule data frame (workers and cost by shift)
+#          and coverage data frame (required and scheduled by period)
+def solve_shift_schedule(servers_needed, constraint_matrix, cost_vector,
+    shift_names = None, period_names = None):
+    requirements = np.asarray(servers_needed, dtype = float)
+    coverage_matrix = np.asarray(constraint_matrix, dtype = float)
+    costs = np.asarray(cost_vector, dtype = float)
+    result = milp(costs, integrality = np.ones(len(costs)),
+        bounds = Bounds(0, np.inf),
+        constraints = LinearConstraint(coverage_matrix, lb = requirements))
+    if not result.success:
+        raise ValueError('shift schedule not solved: ' + result.message)
+    solution = np.round(result.x).astype(int)
+    return(_shift_schedule_tables(solution, requirements, coverage_matrix,
+        costs, shift_names, period_names))
+
+# schedule and coverage tables for a solution to the shift problem
+def _shift_schedule_tables(solution, requirements, coverage_matrix, costs,
+    shift_names, period_names):
+    if shift_names is None:
+        shift_names = np.arange(1, len(costs) + 1)
+    if period_names is None:
+        period_names = np.arange(1, len(requirements) + 1)
+    schedule = pd.DataFrame({'Shift': shift_names, 'ShiftCost': costs,
+        'Solution': solution, 'TotalCost': solution * costs})
+    scheduled = coverage_matrix @ solution
+    coverage = pd.DataFrame({'Period': period_names,
+        'Required': requirements.astype(int),
+        'Scheduled': scheduled.astype(int),
+        'Surplus': (scheduled - requirements).astype(int)})
+    return(schedule, coverage)
+
+
+# Sensitivity Analysis for Shift Scheduling (Python)
+
+# make a previous solution feasible for new requirements and costs
+# workers are added to the shift covering the most short-staffed
+# periods per unit cost, then removed from shifts not needed
+def _repair_schedule(solution, requirements, coverage_matrix, costs):
+    solution = solution.copy()
+    short = coverage_matrix @ solution < requirements
+    while short.any():
+        gain = (coverage_matrix.T @ short) / costs
+        if gain.max() <= 0:
+            return(None)
+        solution[np.argmax(gain)] += 1
+        short = coverage_matrix @ solution < requirements
+    for shift in np.argsort(-costs):
+        covered = coverage_matrix[:, shift] > 0
+        while solution[shift] > 0 and np.all((coverage_matrix @ solution)\
+            [covered] > requirements[covered]):
+            solution[shift] -= 1
+    return(solution)
+
+# shift schedule warm-started from the solution of a similar problem
+# the repaired incumbent is accepted when it attains the bound from the
+# linear programming relaxation, otherwise its cost is a cutoff that
+# prunes the branch and bound search
+def _solve_schedule_warm(requirements, coverage_matrix, costs, incumbent):
+    candidate = None if incumbent is None else \
+        _repair_schedule(incumbent, requirements, coverage_matrix, costs)
+    constraints = [LinearConstraint(coverage_matrix, lb = requirements)]
+    if candidate is not None:
+        relaxation = linprog(costs, A_ub = -coverage_matrix,
+            b_ub = -requirements, bounds = (0, None), method = 'highs')
+        bound = relaxation.fun
+        if np.all(costs == np.round(costs)):
+            step = np.gcd.reduce(np.round(costs).astype(int))
+            bound = np.ceil(bound / step - 1e-9) * step
+        if costs @ candidate <= bound + 1e-9:
+            return(candidate)
+        constraints.append(LinearConstraint(costs,
+            ub = costs @ candidate + 1e-9))
+    result = milp(costs, integrality = np.ones(len(costs)),
+        bounds = Bounds(0, np.inf), constraints = constraints)
+    if not result.success:
+        return(candidate)
+    return(np.round(result.x).astype(int))
+
+# solve a block of related scenarios in order, each warm-started
+# from the previous solution, reusing results for repeated scenarios
+def _solve_schedule_block(requirements, costs, coverage_matrix):
+    solutions = np.zeros(costs.shape, dtype = int)
+    solved = {}
+    incumbent = None
+    for index in range(len(requirements)):
+        key = (requirements[index].tobytes(), costs[index].tobytes())
+        if key not in solved:
+            solved[key] = _solve_schedule_warm(requirements[index],
+                coverage_matrix, costs[index], incumbent)
+        if solved[key] is None:
+            solutions[index] = -1
+            continue
+        incumbent = solved[key]
+        solutions[index] = incumbent
+    return(solutions)
+
+# scenarios for a sensitivity test of the call center schedule
+# every combination of settings is a scenario, with operator
+# requirements for all scenarios computed in one Erlang C call
+# input arrival_rate = arrivals per period (per hour for hourly periods)
+#       service_rate = calls completed per server per period
+#       cost_vector = cost of one worker on each shift
+#       probability_goals = targets for the probability of waiting
+#       demand_multipliers = factors applied to all arrival rates
+#       cost_multipliers = list of factors (scalar or one per shift)
+#       n_draws = random demand perturbations for each combination
+#       demand_noise = standard deviation of log multiplicative noise
+#       closed_periods = indices of periods with no staffing required
+#       random_state = seed for the random perturbations
+# output = data frame of scenario settings with requirement and cost arrays
+def perturbation_scenarios(arrival_rate, service_rate, cost_vector,
+    probability_goals = [0.5], demand_multipliers = [1.0],
+    cost_multipliers = [1.0], n_draws = 1, demand_noise = 0.0,
+    closed_periods = [], random_state = None):
+    arrival_rate = np.asarray(arrival_rate, dtype = float)
+    cost_vector = np.asarray(cost_vector, dtype = float)
+    settings = list(itertools.product(range(len(cost_multipliers)),
+        demand_multipliers, probability_goals, range(n_draws)))
+    cost_index, demand, goal, draw = [np.array(column)
+        for column in zip(*settings)]
+    noise = np.random.default_rng(random_state).normal(0, demand_noise,
+        (len(settings), len(arrival_rate))) if demand_noise > 0 else 0
+    rates = arrival_rate * demand[:, np.newaxis] * np.exp(noise)
+    requirements = servers_required(rates, service_rate,
+        target = 'probability_wait', goal = goal[:, np.newaxis])
+    requirements[:, closed_periods] = 0
+    costs = np.array([cost_vector * np.asarray(cost_multipliers[index])
+        for index in cost_index])
+    return(pd.DataFrame({'cost_multiplier': [cost_multipliers[index]
+            for index in cost_index],
+        'demand_multiplier': demand, 'probability_goal': goal,
+        'draw': draw, 'servers_needed': list(requirements),
+        'cost_vector': list(costs)}))
+
+# minimum-cost shift schedules for many scenarios
+# scenarios are split into contiguous blocks across worker processes
+# and each block is solved in order with warm starts from the previous
+# solution, so neighboring scenarios in the table should be similar
+# input scenarios = data frame with servers_needed and cost_vector
+#                   columns (as from perturbation_scenarios)
+#       constraint_matrix = periods x shifts coverage of each shift
+#       n_jobs = number of worker processes (1 runs in this process)
+# output = scenarios with solution, total cost, workers, and coverage
+def schedule_sensitivity(scenarios, constraint_matrix, n_jobs = None):
+    coverage_matrix = np.asarray(constraint_matrix, dtype = float)
+    requirements = np.array(list(scenarios['servers_needed']), dtype = float)
+    costs = np.array(list(scenarios['cost_vector']), dtype = float)
+    if n_jobs is None:
+        n_jobs = os.cpu_count() or 1
+    blocks = np.array_split(np.arange(len(scenarios)), n_jobs)
+    blocks = [block for block in blocks if len(block) > 0]
+    if n_jobs == 1:
+        solutions = [_solve_schedule_block(requirements[block],
+            costs[block], coverage_matrix) for block in blocks]
+    else:
+        with ProcessPoolExecutor(max_workers = n_jobs) as executor:
+            solutions = list(executor.map(_solve_schedule_block,
+                [requirements[block] for block in blocks],
+                [costs[block] for block in blocks],
+                [coverage_matrix] * len(blocks)))
+    solutions = np.concatenate(solutions)
+    feasible = np.all(solutions >= 0, axis = 1)
+    scheduled = solutions @ coverage_matrix.T
+    results = scenarios.copy()
+    results['solution'] = list(solutions)
+    results['total_cost'] = np.where(feasible,
+        np.sum(solutions * costs, axis = 1), np.nan)
+    results['workers'] = np.where(feasible, solutions.sum(axis = 1), -1)
+    results['scheduled_hours'] = np.where(feasible,
+        scheduled.sum(axis = 1), np.nan)
+    results['surplus_hours'] = np.where(feasible,
+        (scheduled - requirements).sum(axis = 1), np.nan)
+    return(results)
+
+
+# Shift Scheduling by Column Generation (Python)
+
+# all candidate shifts for a planning horizon, stored as start period,
+# length, and break rather than as columns of a constraint matrix
+# input n_periods = periods in the planning horizon (672 for a week
+#                   of 15-minute periods)
+#       period_minutes = length of each period
+#       shift_types = data frame or list of dictionaries with hours
+#                     (shift length), break_hours (unpaid break, 0 for
+#                     none), break_earliest and break_latest (hours after
+#                     start when the break may begin), and hourly_cost
+#       start_step = periods between possible shift starts
+#       cyclic = True if shifts may wrap from the end of the horizon
+#                to the start (as with a week repeated week after week)
+# output = data frame of candidate shifts with start, length, break_start
+#          (periods after start), and break_length in periods, and cost
+def shift_candidates(n_periods, period_minutes, shift_types,
+    start_step = 1, cyclic = True):
+    per_hour = 60 / period_minutes
+    candidates = []
+    for index, shift_type in pd.DataFrame(shift_types).iterrows():
+        length = int(round(shift_type['hours'] * per_hour))
+        break_length = int(round(shift_type.get('break_hours', 0) *
+            per_hour))
+        if break_length > 0:
+            break_starts = np.arange(
+                int(round(shift_type['break_earliest'] * per_hour)),
+                int(round(shift_type['break_latest'] * per_hour)) + 1)
+        else:
+            break_starts = np.zeros(1, dtype = int)
+        last_start = n_periods if cyclic else n_periods - length + 1
+        starts = np.arange(0, last_start, start_step)
+        start, break_start = [grid.ravel()
+            for grid in np.meshgrid(starts, break_starts, indexing = 'ij')]
+        candidates.append(pd.DataFrame({'shift_type': index,
+            'start': start, 'length': length, 'break_start': break_start,
+            'break_length': break_length,
+            'cost': shift_type['hourly_cost'] *
+                (length - break_length) / per_hour}))
+    return(pd.concat(candidates, ignore_index = True))
+
+# sums of period values covered by each candidate shift
+# using cumulative sums over two copies of the horizon, so that the
+# pattern matrix is never formed
+def _covered_sums(values, candidates):
+    prefix = np.concatenate([[0], np.cumsum(np.tile(values, 2))])
+    start = candidates['start'].to_numpy()
+    break_start = start + candidates['break_start'].to_numpy()
+    return(prefix[start + candidates['length'].to_numpy()] - prefix[start]
+        - (prefix[break_start + candidates['break_length'].to_numpy()] -
+        prefix[break_start]))
+
+# sparse periods x shifts pattern matrix for selected candidate shifts
+def _shift_pattern_matrix(candidates, n_periods):
+    rows, columns = [np.zeros(0, dtype = int)], [np.zeros(0, dtype = int)]
+    for column, (start, length, break_start, break_length) in enumerate(
+        candidates[['start', 'length', 'break_start',
+        'break_length']].itertuples(index = False)):
+        offsets = np.arange(length)
+        offsets = offsets[(offsets < break_start) |
+            (offsets >= break_start + break_length)]
+        rows.append((start + offsets) % n_periods)
+        columns.append(np.full(len(offsets), column))
+    rows = np.concatenate(rows)
+    return(csc_matrix((np.ones(len(rows)), (rows, np.concatenate(columns))),
+        shape = (n_periods, len(candidates))))
+
+# minimum-cost shift schedule chosen from a large set of candidate shifts
+# the linear programming relaxation is solved by column generation:
+# starting from artificial columns, each round prices every candidate
+# against the period duals and adds the shifts with most negative
+# reduced cost, until no candidate can lower the cost... the integer
+# program is then solved by branch and bound over the generated shifts
+# with zero reduced cost (price and branch), and the relaxation provides
+# a lower bound for judging the result
+# input servers_needed = workers required in each period
+#       candidates = data frame from shift_candidates
+#       columns_per_round = most shifts added in each pricing round
+#       max_rounds = largest number of pricing rounds
+#       mip_rel_gap = relative gap at which the integer program stops
+#       time_limit = seconds allowed for the integer program
+# output = schedule data frame (shifts with one or more workers),
+#          coverage data frame (required and scheduled by period),
+#          and lower bound on total cost from the linear relaxation
+def solve_shift_schedule_generated(servers_needed, candidates,
+    columns_per_round = 100, max_rounds = 500, mip_rel_gap = 0.01,
+    time_limit = 10):
+    requirements = np.asarray(servers_needed, dtype = float)
+    n_periods = len(requirements)
+    costs = candidates['cost'].to_numpy(dtype = float)
+    # artificial columns cover single periods at a penalty cost
+    generated = np.zeros(0, dtype = int)
+    pattern_matrix = csc_matrix((n_periods, 0))
+    master_matrix = -identity(n_periods, format = 'csc')
+    master_costs = np.full(n_periods, 10 * costs.max())
+    for iteration in range(max_rounds):
+        master = linprog(master_costs, A_ub = master_matrix,
+            b_ub = -requirements, bounds = (0, None), method = 'highs')
+        duals = -master.ineqlin.marginals
+        reduced_costs = costs - _covered_sums(duals, candidates)
+        reduced_costs[generated] = np.inf
+        entering = np.argsort(reduced_costs)[:columns_per_round]
+        entering = entering[reduced_costs[entering] < -1e-9]
+        if len(entering) == 0:
+            break
+        new_patterns = _shift_pattern_matrix(candidates.iloc[entering],
+            n_periods)
+        generated = np.concatenate([generated, entering])
+        pattern_matrix = hstack([pattern_matrix, new_patterns],
+            format = 'csc')
+        master_matrix = hstack([master_matrix, -new_patterns],
+            format = 'csc')
+        master_costs = np.concatenate([master_costs, costs[entering]])
+    if master.x[:n_periods].max() > 1e-9:
+        raise ValueError('requirements cannot be covered by the candidates')
+    priced = costs[generated] - pattern_matrix.T @ duals <= 1e-6
+    generated, pattern_matrix = generated[priced], pattern_matrix[:, priced]
+    result = milp(costs[generated], integrality = np.ones(len(generated)),
+        bounds = Bounds(0, np.inf),
+        constraints = LinearConstraint(pattern_matrix, lb = requirements),
+        options = {'time_limit': time_limit, 'mip_rel_gap': mip_rel_gap})
+    if result.x is None:
+        raise ValueError('shift schedule not solved: ' + result.message)
+    solution = np.round(result.x).astype(int)
+    schedule = candidates.iloc[generated].assign(workers = solution,
+        total_cost = solution * costs[generated])
+    schedule = schedule[schedule['workers'] > 0].sort_values('start')
+    scheduled = pattern_matrix @ solution
+    coverage = pd.DataFrame({'Period': np.arange(n_periods),
+        'Required': requirements.astype(int),
+        'Scheduled': scheduled.astype(int),
+        'Surplus': (scheduled - requirements).astype(int)})
+    return(schedule, coverage, master.fun)
+
+
+# Discrete Event Simulation of the Call Center (Python)
+
+# empirical inputs for simulating the call center
+# input call_center_data = data frame of calls (PHANTOM calls removed)
+#       with date, call_hour, q_time, ser_time, outcome, and server
+# output = dictionary with arrival_rate (calls per hour by day of week
+#          0 = Monday through 6 = Sunday and hour 0 to 23), service_times
+#          in seconds for served calls, and mean_patience in seconds
+#          (exponential patience estimated from abandonments in queue)
+def simulation_inputs(call_center_data):
+    weekday = pd.to_datetime(call_center_data['date']).dt.weekday.to_numpy()
+    hour = call_center_data['call_hour'].to_numpy()
+    calls = np.zeros((7, 24))
+    np.add.at(calls, (weekday, hour), 1)
+    dates = pd.to_datetime(call_center_data['date']).drop_duplicates()
+    days = np.bincount(dates.dt.weekday, minlength = 7)
+    arrival_rate = calls / np.maximum(days, 1)[:, np.newaxis]
+    served = (call_center_data['server'] != 'NO_SERVER') & \
+        (call_center_data['ser_time'] > 0)
+    queued = call_center_data['q_time'] > 0
+    abandoned = queued & (call_center_data['outcome'] == 'HANG')
+    return({'arrival_rate': arrival_rate,
+        'service_times': call_center_data.loc[served, 'ser_time']\
+            .to_numpy(dtype = float),
+        'mean_patience': call_center_data.loc[queued, 'q_time'].sum() /
+            max(abandoned.sum(), 1)})
+
+# one replication of the call center simulation
+# arrivals follow a Poisson process with hourly rates, service times are
+# resampled from the call log, and customers abandon the queue when
+# their wait exceeds an exponential patience time
+# servers are numbered so server k is on duty in hours with more than
+# k servers scheduled, and a call in service when a shift ends is finished
+# a heap holds the times at which each server is next free
+def _simulate_call_center_once(arrival_rate, staffing, service_times,
+    mean_patience, wrap_up, seed):
+    rng = np.random.default_rng(seed)
+    n_hours = len(staffing)
+    counts = rng.poisson(arrival_rate)
+    hour_of_call = np.repeat(np.arange(n_hours), counts)
+    arrivals = np.sort((hour_of_call + rng.random(len(hour_of_call))) * 3600)
+    n_calls = len(arrivals)
+    services = rng.choice(service_times, n_calls) + wrap_up
+    patience = rng.exponential(mean_patience, n_calls)
+
+    # next hour (from each hour) in which each server is on duty
+    n_servers = int(staffing.max(initial = 0))
+    on_duty = staffing[np.newaxis, :] > np.arange(n_servers)[:, np.newaxis]
+    next_on_duty = np.full((n_servers, n_hours + 1), n_hours)
+    for hour in range(n_hours - 1, -1, -1):
+        next_on_duty[:, hour] = np.where(on_duty[:, hour], hour,
+            next_on_duty[:, hour + 1])
+    next_on_duty = next_on_duty.tolist()
+    staffing_list = staffing.tolist()
+    end_time = n_hours * 3600.0
+
+    free = [(next_on_duty[server][0] * 3600.0, server)
+        for server in range(n_servers)]
+    heapq.heapify(free)
+    waits = np.empty(n_calls)
+    abandoned = np.zeros(n_calls, dtype = bool)
+    for call, (arrival, service, limit) in \
+        enumerate(zip(arrivals.tolist(), services.tolist(),
+        patience.tolist())):
+        while True:
+            start, server = free[0] if free else (np.inf, -1)
+            start = max(start, arrival)
+            if start >= end_time:
+                start = np.inf
+                break
+            hour = int(start // 3600)
+            if staffing_list[hour] > server:
+                break
+            heapq.heapreplace(free,
+                (next_on_duty[server][hour] * 3600.0, server))
+        if start - arrival > limit:
+            waits[call] = limit
+            abandoned[call] = True
+        else:
+            waits[call] = start - arrival
+            heapq.heapreplace(free, (start + service, server))
+    return(waits, abandoned)
+
+# summary measures for one simulated set of calls
+def _simulation_summary(waits, abandoned, answer_time, quantiles):
+    answered = waits[~abandoned]
+    summary = {'calls': len(waits), 'abandonment_rate': abandoned.mean(),
+        'probability_wait': np.mean(answered > 0),
+        'mean_wait': answered.mean(),
+        'service_level': np.mean(answered <= answer_time) *
+            (1 - abandoned.mean())}
+    for quantile in quantiles:
+        summary['wait_q' + str(int(round(quantile * 100)))] = \
+            np.quantile(answered, quantile)
+    return(summary)
+
+# replicate the simulation and summarize each replication
+def _simulate_call_center_summary(arrival_rate, staffing, service_times,
+    mean_patience, wrap_up, seed, answer_time, quantiles):
+    waits, abandoned = _simulate_call_center_once(arrival_rate, staffing,
+        service_times, mean_patience, wrap_up, seed)
+    return(_simulation_summary(waits, abandoned, answer_time, quantiles))
+
+# discrete event simulation of the call center over many days
+# input inputs = dictionary from simulation_inputs
+#       staffing = servers on duty by hour of the day (24 values)
+#                  or by day of week and hour (7 x 24 values)
+#       n_days = number of days simulated in each replication
+#       start_weekday = day of week of the first day (0 = Monday)
+#       weekdays = days of week to simulate (default is every day)
+#       wrap_up = seconds a server remains unavailable after each call
+#       n_replications = number of independent replications
+#       n_jobs = number of worker processes (1 runs in this process)
+#       seed = root seed from which every replication's stream is spawned,
+#              so results do not depend on the number of processes
+#       answer_time = seconds for the service level measure
+#       quantiles = waiting-time quantiles reported for answered calls
+# output = data frame with one row per replication (times in seconds)
+def simulate_call_center(inputs, staffing, n_days = 28, start_weekday = 0,
+    weekdays = None, wrap_up = 60, n_replications = 10, n_jobs = None,
+    seed = 1234, answer_time = 20, quantiles = [0.1, 0.25, 0.5, 0.75, 0.9]):
+    if weekdays is None:
+        weekdays = range(7)
+    weekdays = list(weekdays)
+    first = weekdays.index(start_weekday) if start_weekday in weekdays else 0
+    days = [weekdays[(first + day) % len(weekdays)] for day in range(n_days)]
+    staffing = np.broadcast_to(np.asarray(staffing, dtype = int), (7, 24))
+    arrival_rate = inputs['arrival_rate'][days].ravel()
+    hourly_staffing = staffing[days].ravel()
+    seeds = np.random.SeedSequence(seed).spawn(n_replications)
+    arguments = [[arrival_rate] * n_replications,
+        [hourly_staffing] * n_replications,
+        [inputs['service_times']] * n_replications,
+        [inputs['mean_patience']] * n_replications,
+        [wrap_up] * n_replications, seeds,
+        [answer_time] * n_replications, [quantiles] * n_replications]
+    if n_jobs is None:
+        n_jobs = os.cpu_count() or 1
+    if n_jobs == 1:
+        summaries = list(map(_simulate_call_center_summary, *arguments))
+    else:
+        with ProcessPoolExecutor(max_workers = n_jobs) as executor:
+            summaries = list(executor.map(_simulate_call_center_summary,
+                *arguments))
+    results = pd.DataFrame(summaries)
+    results.insert(0, 'replication', np.arange(1, n_replications + 1))
+    return(results)
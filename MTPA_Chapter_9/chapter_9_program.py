@@ -3,48 +3,93 @@
 from __future__ import division, print_function
 
 import numpy as np
-from scipy.stats import nbinom
-
-def simulator(home_mean, away_mean, niterations):
-    # estimates probability of home team win
-    seed(1234)  # set to obtain reproducible results
-    home_game_score = [0] * niterations
-    away_game_score = [0] * niterations
-    home_win = [0] * niterations
-    i = 0
-    while (i < niterations):
-        home_game_score[i] = \
-            nbinom.rvs(n = 4.0, p = 4.0/(4.0 + home_mean), size = 1)[0] 
-        away_game_score[i] = \
-            nbinom.rvs(n = 4.0, p = 4.0/(4.0 + away_mean), size = 1)[0]         
-        if (home_game_score[i] > away_game_score[i]):
-            home_win[i] = 1
-        if ((away_game_score[i] > home_game_score[i]) or \
-            (away_game_score[i] < home_game_score[i])):
-            i = i + 1 
-    n_home_win = sum(home_win)
-    return n_home_win / niterations        
- 
+import pandas as pd
+
+# import user-defined module
+# simulator draws home and away scores for all games at once
+# with negative binomial distributions, replaying only tied games
+from chapter_9_utilities import simulator, probability_table,\
+    win_probability_table, adaptive_probability_table, simulate_seasons,\
+    season_standings, win_probability_grid, save_win_probability_grid,\
+    load_win_probability_grid, lookup_win_probability
+
+# check the simulator for one game-day setting
+# returns probability of home team win and its standard error
+print(simulator(5.0, 4.0, 100000, random_state = 1234))
+
 niterations = 100000  # use smaller number for testing
 # probability matrix for results... home team rows, away team columns
-probmat = array([[0.0] * 9] * 9)
-
-# matrix representation of home and away team runs for table
-homemat = array([[9] * 9, [8] * 9, [7] * 9, [6] * 9, [5] * 9,\
-    [4] * 9, [3] * 9, [2] *9, [1] * 9])
-awayrow = array([1, 2, 3, 4, 5, 6, 7, 8, 9])    
-awaymat = array([awayrow] * 9)
-
-# generate table of probabilities
-for index_home in range(9):
-    for index_away in range(9):
-        if (homemat[index_home,index_away] != awaymat[index_home,index_away]):
-            print(index_home, index_away)
-            probmat[index_home, index_away] = \
-                simulator(float(homemat[index_home, index_away]), \
-                          float(awaymat[index_home, index_away]), niterations)
-            
-print(probmat)                
+# home team runs 9 down to 1, away team runs 1 up to 9
+homerow = np.array([9, 8, 7, 6, 5, 4, 3, 2, 1])
+awayrow = np.array([1, 2, 3, 4, 5, 6, 7, 8, 9])
+
+# the table computed exactly from negative binomial probabilities
+# (no simulation, so no sampling error)... equal mean runs give 0.5
+exact_probmat = win_probability_table(homerow, awayrow, dispersion = 4.0)
+print(exact_probmat)
+
+# for mean runs that are not whole numbers, save a fine grid of exact
+# probabilities once and interpolate... the grid reports a bound on
+# interpolation error, and lookups needing more precision than the grid
+# provides (or outside the grid) are computed exactly and cached
+save_win_probability_grid(win_probability_grid(\
+    home_runs = np.arange(0.5, 15.01, 0.05),\
+    away_runs = np.arange(0.5, 15.01, 0.05), dispersion = 4.0),\
+    'win_probability_grid.npz')
+probability_grid = load_win_probability_grid('win_probability_grid.npz')
+print('\nLargest interpolation error bound:', probability_grid['max_error'])
+print(lookup_win_probability(probability_grid, 4.37, 3.91))
+print(lookup_win_probability(probability_grid, 4.37, 3.91, tolerance = 1e-6))
+
+# generate table of probabilities (and Monte Carlo standard errors)
+# cells are simulated in parallel, each with its own random stream
+# spawned from random_state, to obtain reproducible results
+# for any number of worker processes
+if __name__ == '__main__':
+    probmat, semat = probability_table(homerow, awayrow, niterations,\
+        dispersion = 4.0, random_state = 1234, n_jobs = None)
+
+    print(probmat)
+    print('\nLargest standard error:', semat.max())
+    off_diagonal = homerow[:, np.newaxis] != awayrow
+    print('\nLargest difference between simulated and exact probabilities:',\
+        np.abs(probmat - exact_probmat)[off_diagonal].max())
+
+    # rather than a fixed number of games for every cell, simulate
+    # in batches until each 95 percent confidence interval is within
+    # plus or minus 0.003 (about the precision of 100000 games for
+    # probabilities near 0.5)... most games go to cells near 0.5
+    adaptive_probmat, halfwidthmat, gamesmat = \
+        adaptive_probability_table(homerow, awayrow, tolerance = 0.003,\
+        batch_size = 10000, max_iterations = 1000000, confidence = 0.95,\
+        dispersion = 4.0, random_state = 1234, n_jobs = None)
+    print(adaptive_probmat)
+    print('\nLargest confidence interval half-width:', halfwidthmat.max())
+    print('\nGames simulated for each cell:\n', gamesmat)
+    print('\nTotal games simulated:', gamesmat.sum(),\
+        'versus', niterations * off_diagonal.sum(), 'with fixed niterations')
+
+# from single games to whole seasons... the 2012 home schedules
+# of all thirty Major League Baseball teams (Appendix C) give
+# the home team and opponent for every game of the season
+schedule = pd.read_csv('../MTPA_Appendix_C/bobbleheads.csv')
+print('\nGames in the 2012 schedule:', len(schedule))
+
+# mean runs per game for each team... here every team scores
+# 4.3 runs on average, except the Dodgers with 4.8
+# (try mean runs from real team statistics)
+run_means = pd.Series(4.3, index = np.union1d(schedule['home_team'],\
+    schedule['opponent']))
+run_means['Los Angeles Dodgers'] = 4.8
+
+# simulate ten thousand seasons, all games of a thousand seasons at a time
+seasons = simulate_seasons(schedule, run_means, n_seasons = 10000,\
+    home_field = 1.0, dispersion = 4.0, batch_size = 1000,\
+    random_state = 1234)
+standings, rank_probabilities = season_standings(seasons,\
+    quantiles = [0.05, 0.25, 0.5, 0.75, 0.95])
+print(standings.sort_values('mean_wins', ascending = False).head(10))
+print(rank_probabilities.loc['Los Angeles Dodgers'].head(10))
 
 # Suggestion for the student: Develop simulators for football or basketball.
 # Use matplotlib to create a probability heat-map for the probmat results.
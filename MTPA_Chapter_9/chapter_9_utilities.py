@@ -0,0 +1,397 @@
+# Utilities for Game-day Simulation (Python)
+
+import os  # number of processors available
+import bisect  # grid search for single lookups
+import functools  # cache for exact probabilities
+import numbers  # single numbers versus arrays
+from concurrent.futures import ProcessPoolExecutor  # parallel processing
+import numpy as np  # arrays and random number generation
+import pandas as pd  # data frame operations
+from scipy.stats import nbinom, norm  # probability distributions
+
+
+# Game-day Simulator for Baseball with Arrays (Python)
+
+# runs scored by a team in a game are negative binomial with mean
+# equal to the team's mean runs and size (dispersion) parameter n,
+# so that the probability parameter is n / (n + mean)
+
+# simulate scores for many games at once
+# games ending in a tie are replayed, drawing new scores for only
+# the tied games until no ties remain
+# input home_mean, away_mean = mean runs for home and away teams
+#       niterations = number of games (none ending in a tie)
+#       dispersion = negative binomial size parameter
+#       random_state = seed or numpy random Generator
+# output = arrays of home and away scores
+def simulate_game_scores(home_mean, away_mean, niterations,
+    dispersion = 4.0, random_state = None):
+    rng = np.random.default_rng(random_state)
+    home_p = dispersion / (dispersion + home_mean)
+    away_p = dispersion / (dispersion + away_mean)
+    home_score = rng.negative_binomial(dispersion, home_p, niterations)
+    away_score = rng.negative_binomial(dispersion, away_p, niterations)
+    tied = np.flatnonzero(home_score == away_score)
+    while len(tied) > 0:
+        home_score[tied] = rng.negative_binomial(dispersion, home_p,
+            len(tied))
+        away_score[tied] = rng.negative_binomial(dispersion, away_p,
+            len(tied))
+        tied = tied[home_score[tied] == away_score[tied]]
+    return(home_score, away_score)
+
+# estimate probability of home team win
+# input home_mean, away_mean = mean runs for home and away teams
+#       niterations = number of games simulated
+#       dispersion = negative binomial size parameter
+#       random_state = seed or numpy random Generator
+# output = estimated probability and its Monte Carlo standard error
+def simulator(home_mean, away_mean, niterations, dispersion = 4.0,
+    random_state = None):
+    home_score, away_score = simulate_game_scores(home_mean, away_mean,
+        niterations, dispersion = dispersion, random_state = random_state)
+    probability = np.mean(home_score > away_score)
+    standard_error = np.sqrt(probability * (1 - probability) / niterations)
+    return(probability, standard_error)
+
+# estimate probability of home team win to a given precision
+# games are simulated in batches until the confidence interval
+# half-width is no more than tolerance (or max_iterations is reached)
+# input home_mean, away_mean = mean runs for home and away teams
+#       tolerance = largest acceptable confidence interval half-width
+#       batch_size = number of games simulated in each batch
+#       max_iterations = largest number of games simulated
+#       confidence = confidence level for the interval
+#       dispersion = negative binomial size parameter
+#       random_state = seed or numpy random Generator
+# output = estimated probability, confidence interval half-width,
+#          and number of games simulated
+def adaptive_simulator(home_mean, away_mean, tolerance = 0.001,
+    batch_size = 10000, max_iterations = 1000000, confidence = 0.95,
+    dispersion = 4.0, random_state = None):
+    rng = np.random.default_rng(random_state)
+    z = norm.ppf(0.5 + confidence / 2)
+    n_home_win = 0
+    ngames = 0
+    while True:
+        batch = min(batch_size, max_iterations - ngames)
+        home_score, away_score = simulate_game_scores(home_mean, away_mean,
+            batch, dispersion = dispersion, random_state = rng)
+        n_home_win = n_home_win + np.sum(home_score > away_score)
+        ngames = ngames + batch
+        probability = n_home_win / ngames
+        half_width = z * np.sqrt(probability * (1 - probability) / ngames)
+        if half_width <= tolerance or ngames >= max_iterations:
+            return(probability, half_width, ngames)
+
+# results of a simulator for each cell of a table of mean runs
+# each cell has its own random stream spawned from one root seed,
+# so cells may be simulated by any number of worker processes
+# with the same results
+def _simulate_cells(simulator, home_runs, away_runs, settings,
+    random_state, n_jobs):
+    cells = [(index_home, index_away)
+        for index_home, home_mean in enumerate(home_runs)
+        for index_away, away_mean in enumerate(away_runs)
+        if home_mean != away_mean]
+    seeds = np.random.SeedSequence(random_state).spawn(len(cells))
+    arguments = [[float(home_runs[index_home]) for index_home, _ in cells],
+        [float(away_runs[index_away]) for _, index_away in cells]] + \
+        [[setting] * len(cells) for setting in settings] + \
+        [[np.random.default_rng(seed) for seed in seeds]]
+    if n_jobs is None:
+        n_jobs = os.cpu_count() or 1
+    if n_jobs == 1:
+        results = list(map(simulator, *arguments))
+    else:
+        with ProcessPoolExecutor(max_workers = n_jobs) as executor:
+            results = list(executor.map(simulator, *arguments,
+                chunksize = max(1, len(cells) // (4 * n_jobs))))
+    tables = np.zeros((len(results[0]), len(home_runs), len(away_runs)))
+    for (index_home, index_away), result in zip(cells, results):
+        tables[:, index_home, index_away] = result
+    return(tables)
+
+# table of probabilities of home team win
+# cells where home and away mean runs are equal are left at zero
+# input home_runs = mean runs for home teams (table rows)
+#       away_runs = mean runs for away teams (table columns)
+#       niterations = number of games simulated for each cell
+#       dispersion = negative binomial size parameter
+#       random_state = root seed (integer) for the cell streams
+#       n_jobs = number of worker processes (1 runs in this process)
+# output = arrays of probabilities and standard errors
+def probability_table(home_runs, away_runs, niterations, dispersion = 4.0,
+    random_state = None, n_jobs = None):
+    probmat, semat = _simulate_cells(simulator, home_runs, away_runs,
+        [niterations, dispersion], random_state, n_jobs)
+    return(probmat, semat)
+
+# table of probabilities of home team win to a given precision
+# each cell is simulated in batches until its confidence interval
+# half-width reaches tolerance, so cells with probabilities near 0.5
+# use the most games... cells where mean runs are equal are left at zero
+# input home_runs = mean runs for home teams (table rows)
+#       away_runs = mean runs for away teams (table columns)
+#       tolerance, batch_size, max_iterations, confidence = settings
+#           for each cell as in adaptive_simulator
+#       dispersion = negative binomial size parameter
+#       random_state = root seed (integer) for the cell streams
+#       n_jobs = number of worker processes (1 runs in this process)
+# output = arrays of probabilities, confidence interval half-widths,
+#          and numbers of games simulated
+def adaptive_probability_table(home_runs, away_runs, tolerance = 0.001,
+    batch_size = 10000, max_iterations = 1000000, confidence = 0.95,
+    dispersion = 4.0, random_state = None, n_jobs = None):
+    probmat, halfwidthmat, gamesmat = _simulate_cells(adaptive_simulator,
+        home_runs, away_runs, [tolerance, batch_size, max_iterations,
+        confidence, dispersion], random_state, n_jobs)
+    return(probmat, halfwidthmat, gamesmat.astype(int))
+
+
+# Exact Probabilities of Home Team Win (Python)
+
+# probability of home team win for every pair of home and away mean runs
+# with independent negative binomial scores and tied games replayed
+#     P(home wins) = P(home > away) / (1 - P(home = away))
+# the score distributions are truncated where the upper tail probability
+# falls below tail, and the sums over scores are matrix products of the
+# home probability mass functions with the away probability mass and
+# cumulative distribution functions, covering the whole table at once
+# input home_runs = mean runs for home teams (table rows)
+#       away_runs = mean runs for away teams (table columns)
+#       dispersion = negative binomial size parameter
+#       tail = probability of scores beyond the truncation point
+# output = array of probabilities (0.5 where mean runs are equal)
+def win_probability_table(home_runs, away_runs, dispersion = 4.0,
+    tail = 1e-12):
+    home_p = dispersion / (dispersion + np.asarray(home_runs, dtype = float))
+    away_p = dispersion / (dispersion + np.asarray(away_runs, dtype = float))
+    max_runs = int(nbinom.isf(tail, dispersion,
+        min(home_p.min(), away_p.min())))
+    runs = np.arange(max_runs + 1)
+    home_pmf = nbinom.pmf(runs, dispersion, home_p[:, np.newaxis])
+    away_pmf = nbinom.pmf(runs, dispersion, away_p[:, np.newaxis])
+    # probability that the away team scores fewer than each score
+    away_below = np.cumsum(away_pmf, axis = 1) - away_pmf
+    home_greater = home_pmf @ away_below.T
+    tied = home_pmf @ away_pmf.T
+    return(home_greater / (1 - tied))
+
+
+# Win Probability Lookup (Python)
+
+# grid of exact probabilities of home team win for interpolation
+# bilinear interpolation within a grid cell of widths hx and hy is
+# in error by at most hx^2/8 max|f_xx| + hy^2/8 max|f_yy|, with second
+# derivatives estimated by second differences around the cell
+# input home_runs, away_runs = increasing grid values of mean runs
+#       dispersion = negative binomial size parameter
+# output = dictionary with home_runs, away_runs, probabilities,
+#          dispersion, error_bound (for each grid cell), and max_error
+def win_probability_grid(home_runs = np.arange(0.5, 15.01, 0.05),
+    away_runs = np.arange(0.5, 15.01, 0.05), dispersion = 4.0):
+    from scipy.ndimage import maximum_filter
+    home_runs = np.asarray(home_runs, dtype = float)
+    away_runs = np.asarray(away_runs, dtype = float)
+    probabilities = win_probability_table(home_runs, away_runs,
+        dispersion = dispersion)
+    home_width = np.diff(home_runs)[:, np.newaxis]
+    away_width = np.diff(away_runs)[np.newaxis, :]
+    curvature = []
+    for axis, width in [(0, home_width), (1, away_width)]:
+        second = np.abs(np.diff(probabilities, 2, axis = axis)) / \
+            (np.take(width, range(len(width.ravel()) - 1), axis = axis) *
+            np.take(width, range(1, len(width.ravel())), axis = axis))
+        second = np.pad(second, [(1, 1) if k == axis else (0, 0)
+            for k in range(2)], mode = 'edge')
+        second = maximum_filter(second, size = 3)
+        curvature.append(np.maximum.reduce([second[:-1, :-1],
+            second[1:, :-1], second[:-1, 1:], second[1:, 1:]]))
+    error_bound = home_width ** 2 / 8 * curvature[0] + \
+        away_width ** 2 / 8 * curvature[1]
+    return({'home_runs': home_runs, 'away_runs': away_runs,
+        'probabilities': probabilities, 'dispersion': dispersion,
+        'error_bound': error_bound, 'max_error': error_bound.max()})
+
+# save a probability grid to a compressed numpy file
+def save_win_probability_grid(grid, path):
+    np.savez_compressed(path, **grid)
+
+# load a probability grid saved by save_win_probability_grid
+def load_win_probability_grid(path):
+    with np.load(path) as saved:
+        grid = dict((key, saved[key]) for key in saved.files)
+    grid['dispersion'] = float(grid['dispersion'])
+    grid['max_error'] = float(grid['max_error'])
+    return(grid)
+
+# grid cells and positions within cells for mean runs
+def _grid_cells(grid, home_mean, away_mean):
+    home_runs, away_runs = grid['home_runs'], grid['away_runs']
+    i = np.clip(np.searchsorted(home_runs, home_mean) - 1, 0,
+        len(home_runs) - 2)
+    j = np.clip(np.searchsorted(away_runs, away_mean) - 1, 0,
+        len(away_runs) - 2)
+    u = (home_mean - home_runs[i]) / (home_runs[i + 1] - home_runs[i])
+    v = (away_mean - away_runs[j]) / (away_runs[j + 1] - away_runs[j])
+    return(i, j, u, v)
+
+# bilinear interpolation of grid probabilities
+def _interpolate_grid(probabilities, i, j, u, v):
+    return((1 - u) * (1 - v) * probabilities[i, j] +
+        u * (1 - v) * probabilities[i + 1, j] +
+        (1 - u) * v * probabilities[i, j + 1] +
+        u * v * probabilities[i + 1, j + 1])
+
+# exact probability of home team win for one pair of mean runs
+# recent results are kept in a least-recently-used cache
+@functools.lru_cache(maxsize = 4096)
+def exact_win_probability(home_mean, away_mean, dispersion = 4.0):
+    return(float(win_probability_table([home_mean], [away_mean],
+        dispersion = dispersion)[0, 0]))
+
+# probability of home team win at any mean runs
+# interpolated from the grid, with exact (cached) computation for
+# means outside the grid or in grid cells whose error bound is
+# larger than the tolerance asked for
+# input grid = dictionary from win_probability_grid
+#       home_mean, away_mean = mean runs (numbers or arrays)
+#       tolerance = largest acceptable error (None accepts the grid's)
+# output = probabilities of home team win (number or array)
+def lookup_win_probability(grid, home_mean, away_mean, tolerance = None):
+    home_runs, away_runs = grid['home_runs'], grid['away_runs']
+    if isinstance(home_mean, numbers.Real) and \
+        isinstance(away_mean, numbers.Real):
+        # single lookups avoid numpy overhead on scalars
+        home_mean, away_mean = float(home_mean), float(away_mean)
+        if home_runs[0] <= home_mean <= home_runs[-1] and \
+            away_runs[0] <= away_mean <= away_runs[-1]:
+            i = min(max(bisect.bisect_left(home_runs, home_mean) - 1, 0),
+                len(home_runs) - 2)
+            j = min(max(bisect.bisect_left(away_runs, away_mean) - 1, 0),
+                len(away_runs) - 2)
+            if tolerance is None or grid['error_bound'][i, j] <= tolerance:
+                u = (home_mean - home_runs[i]) / \
+                    (home_runs[i + 1] - home_runs[i])
+                v = (away_mean - away_runs[j]) / \
+                    (away_runs[j + 1] - away_runs[j])
+                return(float(_interpolate_grid(grid['probabilities'],
+                    i, j, u, v)))
+        return(exact_win_probability(home_mean, away_mean,
+            grid['dispersion']))
+    home_mean, away_mean = np.broadcast_arrays(
+        np.asarray(home_mean, dtype = float),
+        np.asarray(away_mean, dtype = float))
+    i, j, u, v = _grid_cells(grid, home_mean, away_mean)
+    probability = np.array(_interpolate_grid(grid['probabilities'],
+        i, j, u, v), dtype = float)
+    exact = (home_mean < home_runs[0]) | (home_mean > home_runs[-1]) | \
+        (away_mean < away_runs[0]) | (away_mean > away_runs[-1])
+    if tolerance is not None:
+        exact = exact | (grid['error_bound'][i, j] > tolerance)
+    probability[exact] = [exact_win_probability(float(home), float(away),
+        grid['dispersion']) for home, away in
+        zip(home_mean[exact], away_mean[exact])]
+    return(probability)
+
+
+# Season Simulator for Baseball (Python)
+
+# simulate many seasons of a league schedule at once
+# every game of a batch of seasons is drawn in one seasons x games array,
+# tied games are replayed, and wins are tallied for all teams with
+# matrix products... each batch has its own random stream spawned from
+# one root seed, so results depend on batch_size but not on memory used
+# input schedule = data frame with home_team and opponent for each game
+#       run_means = series (or dictionary) of mean runs indexed by team
+#       n_seasons = number of seasons simulated
+#       home_field = multiplier for mean runs of the home team
+#       dispersion = negative binomial size parameter
+#       batch_size = number of seasons simulated together
+#       random_state = root seed (integer) for the batch streams
+# output = dictionary with wins (seasons x teams array), teams,
+#          and games (games scheduled for each team)
+def simulate_seasons(schedule, run_means, n_seasons = 10000,
+    home_field = 1.0, dispersion = 4.0, batch_size = 1000,
+    random_state = None):
+    teams = np.union1d(schedule['home_team'].unique(),
+        schedule['opponent'].unique())
+    run_means = pd.Series(run_means, dtype = float).reindex(teams)
+    if run_means.isnull().any():
+        raise ValueError('no mean runs for ' +
+            ', '.join(teams[run_means.isnull().to_numpy()]))
+    home = np.searchsorted(teams, schedule['home_team'])
+    away = np.searchsorted(teams, schedule['opponent'])
+    n_games = len(schedule)
+    home_p = dispersion / (dispersion + home_field *
+        run_means.to_numpy()[home])
+    away_p = dispersion / (dispersion + run_means.to_numpy()[away])
+    home_matrix = np.zeros((n_games, len(teams)), dtype = np.float32)
+    home_matrix[np.arange(n_games), home] = 1
+    away_matrix = np.zeros((n_games, len(teams)), dtype = np.float32)
+    away_matrix[np.arange(n_games), away] = 1
+    wins = np.zeros((n_seasons, len(teams)), dtype = np.int32)
+    starts = range(0, n_seasons, batch_size)
+    for start, seed in zip(starts,
+        np.random.SeedSequence(random_state).spawn(len(starts))):
+        rng = np.random.default_rng(seed)
+        n_batch = min(batch_size, n_seasons - start)
+        home_score = rng.negative_binomial(dispersion, home_p,
+            (n_batch, n_games))
+        away_score = rng.negative_binomial(dispersion, away_p,
+            (n_batch, n_games))
+        season, game = np.nonzero(home_score == away_score)
+        while len(game) > 0:
+            home_score[season, game] = rng.negative_binomial(dispersion,
+                home_p[game])
+            away_score[season, game] = rng.negative_binomial(dispersion,
+                away_p[game])
+            tied = home_score[season, game] == away_score[season, game]
+            season, game = season[tied], game[tied]
+        home_win = (home_score > away_score).astype(np.float32)
+        wins[start:(start + n_batch)] = home_win @ home_matrix + \
+            (1 - home_win) @ away_matrix
+    return({'wins': wins, 'teams': list(teams),
+        'games': (home_matrix.sum(axis = 0) +
+            away_matrix.sum(axis = 0)).astype(int)})
+
+# standings from simulated seasons
+# a team's rank in a season is one plus the number of teams in its
+# division (or the league) with more wins, so teams tied share a rank
+# input seasons = dictionary from simulate_seasons
+#       quantiles = probabilities for win-total quantiles
+#       divisions = optional dictionary of division for each team
+#                   (default ranks teams across the whole league)
+# output = data frame by team with games, mean and standard deviation
+#          of wins, win-total quantiles, mean rank, and probability of
+#          first place, and data frame of probabilities of each rank
+def season_standings(seasons, quantiles = [0.05, 0.25, 0.5, 0.75, 0.95],
+    divisions = None):
+    wins = seasons['wins']
+    teams = seasons['teams']
+    if divisions is None:
+        division = np.zeros(len(teams), dtype = int)
+    else:
+        division = pd.factorize(np.array([divisions[team]
+            for team in teams]))[0]
+    rivals = division[:, np.newaxis] == division
+    rank = 1 + np.einsum('stk,tk->st',
+        (wins[:, np.newaxis, :] > wins[:, :, np.newaxis]).astype(np.int16),
+        rivals.astype(np.int16))
+    standings = pd.DataFrame({'games': seasons['games'],
+        'mean_wins': wins.mean(axis = 0), 'sd_wins': wins.std(axis = 0)},
+        index = pd.Index(teams, name = 'team'))
+    if divisions is not None:
+        standings.insert(0, 'division', [divisions[team] for team in teams])
+    for q, values in zip(quantiles, np.quantile(wins, quantiles, axis = 0)):
+        standings['wins_q%g' % (100 * q)] = values
+    standings['mean_rank'] = rank.mean(axis = 0)
+    standings['p_first'] = (rank == 1).mean(axis = 0)
+    rank_probabilities = pd.DataFrame(np.stack([np.bincount(rank[:, team],
+        minlength = rivals.sum(axis = 1).max() + 1)[1:]
+        for team in range(len(teams))]) / len(wins),
+        index = standings.index,
+        columns = pd.RangeIndex(1, rivals.sum(axis = 1).max() + 1,
+        name = 'rank'))
+    return(standings, rank_probabilities)